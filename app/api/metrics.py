@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from utils.metrics import get_registry
+
+router = APIRouter()
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics() -> Response:
+    """
+    Application metrics in Prometheus text format
+    """
+    return Response(
+        content=generate_latest(get_registry()),
+        media_type=CONTENT_TYPE_LATEST
+    )
@@ -3,11 +3,14 @@ from http import HTTPStatus
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
 sys.path.append('.')
 from api.v1.models.film import FilmDetails, Film
-from api.v1.utils.errors import NotFoundDetail
+from api.v1.utils.errors import BadRequestDetail, NotFoundDetail
 from api.v1.utils.authentication import has_access, authorized
+from api.v1.utils.export import NDJSON_MEDIA_TYPE, ndjson_response
+from core.config import settings
 from services.films import FilmService, get_film_service
 from utils.cache import cache
 
@@ -16,13 +19,14 @@ router = APIRouter()
 
 @router.get('/search', response_model=List[Film], summary='Get search results')
 @has_access('subscriber')
-@cache()
+@cache(raw_response=True, model=Film)
 async def films_search(
         request: Request,
         sort: str | None = None,
         query: str | None = None,
         page: int | None = Query(default=1, alias='page[number]'),
         page_size: int | None = Query(default=50, alias='page[size]'),
+        cursor: str | None = Query(default=None, alias='page[cursor]'),
         film_service: FilmService = Depends(get_film_service)
 ) -> List[Film]:
     """
@@ -31,6 +35,9 @@ async def films_search(
     Pagination settings can be passed using 'page[size]' and 'page[number]'
     parameters, default settings are: page size=50, page number=1
 
+    To walk through all results pass the 'X-Next-Cursor' response header
+    of the previous page as 'page[cursor]' instead of 'page[number]'
+
     If 'query' is omitted than all movies with pagination settings will be retrieved
 
     Movie information:
@@ -38,8 +45,47 @@ async def films_search(
     - **title**: film title
     - **imdb_rating**: rating of the movie
     """
-    films_list = await film_service.get_list(query=query, sort=sort,
-                                             page=page, page_size=page_size)
+    try:
+        films_list = await film_service.get_list(
+            query=query, sort=sort, page=page, page_size=page_size,
+            cursor=cursor, model=Film
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail=BadRequestDetail.CURSOR
+        )
+    if not films_list:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail=NotFoundDetail.FILMS
+        )
+
+    return films_list
+
+
+@router.get('/batch', response_model=List[FilmDetails],
+            summary='Get films by ids')
+@authorized
+async def films_batch(
+        request: Request,
+        ids: List[str] = Query(
+            default=..., alias='id', max_items=settings.BATCH_MAX_SIZE
+        ),
+        film_service: FilmService = Depends(get_film_service)
+) -> List[FilmDetails]:
+    """
+    Get information of several films by their ids passed as 'id' parameters,
+    unknown ids are skipped:
+
+    - **id**: each film has a unique id
+    - **title**: film title
+    - **description**: short film description
+    - **imdb_rating**: rating of the movie
+    - **genres**: list of film genres
+    - **directors**: list of film directors
+    - **writers**: list of film writers
+    - **actors**: list of film actors
+    """
+    films_list = await film_service.get_by_ids(ids, cache=film_details.cache)
     if not films_list:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=NotFoundDetail.FILMS
@@ -48,9 +94,38 @@ async def films_search(
     return films_list
 
 
+@router.get('/export', response_class=StreamingResponse,
+            responses={200: {'content': {NDJSON_MEDIA_TYPE: {}}}},
+            summary='Export all movies')
+@authorized
+async def films_export(
+        request: Request,
+        fields: List[str] | None = Query(default=None, alias='field'),
+        after: str | None = None,
+        film_service: FilmService = Depends(get_film_service)
+) -> StreamingResponse:
+    """
+    Stream all movies in the order of ids as NDJSON, one movie per line.
+
+    Fields of the movies can be selected with 'field' parameters,
+    the id is always included, by default all fields are exported.
+
+    To resume an interrupted export pass the id of the last received movie
+    as 'after'
+    """
+    try:
+        batches = film_service.export(fields=fields, after=after)
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail=BadRequestDetail.FIELDS
+        )
+
+    return await ndjson_response(batches, NotFoundDetail.FILMS)
+
+
 @router.get('/{film_id}', response_model=FilmDetails, summary="Get film by id")
 @authorized
-@cache()
+@cache(raw_response=True, model=FilmDetails, id_param='film_id')
 async def film_details(
         request: Request,
         film_id: str,
@@ -78,7 +153,7 @@ async def film_details(
 
 
 @router.get('/', response_model=List[Film], summary='Get all movies')
-@cache()
+@cache(raw_response=True, model=Film)
 async def films(
         request: Request,
         sort: str | None = None,
@@ -86,6 +161,7 @@ async def films(
         genre: str | None = Query(default=None, alias='filter[genre]'),
         page: int | None = Query(default=1, alias='page[number]'),
         page_size: int | None = Query(default=50, alias='page[size]'),
+        cursor: str | None = Query(default=None, alias='page[cursor]'),
         film_service: FilmService = Depends(get_film_service)
 ) -> List[Film]:
     """
@@ -94,14 +170,23 @@ async def films(
     Pagination settings can be passed using 'page[size]' and 'page[number]'
     parameters, default settings are: page size=50, page number=1
 
+    To walk through all movies pass the 'X-Next-Cursor' response header
+    of the previous page as 'page[cursor]' instead of 'page[number]'
+
     Movie information:
     - **id**: each film has a unique id
     - **title**: film title
     - **imdb_rating**: rating of the movie
     """
-    films_list = await film_service.get_list(sort=sort, genre=genre,
-                                             similar_to=similar_to,
-                                             page=page, page_size=page_size)
+    try:
+        films_list = await film_service.get_list(
+            sort=sort, genre=genre, similar_to=similar_to,
+            page=page, page_size=page_size, cursor=cursor, model=Film
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail=BadRequestDetail.CURSOR
+        )
     if not films_list:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=NotFoundDetail.FILMS
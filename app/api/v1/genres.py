@@ -1,10 +1,11 @@
 from http import HTTPStatus
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
 from api.v1.models.genre import Genre
 from api.v1.utils.errors import NotFoundDetail
+from core.config import settings
 from services.genres import GenreService, get_genre_service
 from utils.cache import cache
 
@@ -16,7 +17,7 @@ router = APIRouter()
 
 @router.get('/', response_model=List[Genre], summary='Get all genres')
 @authorized
-@cache()
+@cache(raw_response=True, model=Genre)
 async def genres_list(
         request: Request,
         genre_service: GenreService = Depends(get_genre_service)
@@ -36,9 +37,34 @@ async def genres_list(
     return genres
 
 
+@router.get('/batch', response_model=List[Genre], summary='Get genres by ids')
+@strict_verification('admin')
+async def genres_batch(
+        request: Request,
+        ids: List[str] = Query(
+            default=..., alias='id', max_items=settings.BATCH_MAX_SIZE
+        ),
+        genre_service: GenreService = Depends(get_genre_service)
+) -> List[Genre]:
+    """
+    Get information of several genres by their ids passed as 'id' parameters,
+    unknown ids are skipped:
+
+    - **id**: each genre has a unique id
+    - **name**: genre name
+    """
+    genres = await genre_service.get_by_ids(ids, cache=genre_by_id.cache)
+    if not genres:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail=NotFoundDetail.GENRES
+        )
+
+    return genres
+
+
 @router.get('/{genre_id}', response_model=Genre, summary="Get genre by id")
 @strict_verification('admin')
-@cache()
+@cache(raw_response=True, model=Genre, id_param='genre_id')
 async def genre_by_id(
         request: Request,
         genre_id: str,
@@ -2,13 +2,17 @@ from http import HTTPStatus
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
 from api.v1.models.film import Film
 from api.v1.models.person import Person
-from api.v1.utils.errors import NotFoundDetail
+from api.v1.utils.errors import BadRequestDetail, NotFoundDetail
+from api.v1.utils.export import NDJSON_MEDIA_TYPE, ndjson_response
+from core.config import settings
 from services.films import FilmService, get_film_service
 from services.persons import PersonService, get_person_service
 from utils.cache import cache
+from utils.pagination import Page
 
 from api.v1.utils.authentication import has_access, authorized
 
@@ -18,12 +22,13 @@ router = APIRouter()
 @router.get('/search', response_model=List[Person],
             summary='Get search results')
 @has_access('subscriber')
-@cache()
+@cache(raw_response=True, model=Person)
 async def persons_search(
         request: Request,
         query: str | None = None,
         page: int | None = Query(default=1, alias='page[number]'),
         page_size: int | None = Query(default=50, alias='page[size]'),
+        cursor: str | None = Query(default=None, alias='page[cursor]'),
         person_service: PersonService = Depends(get_person_service)
 ) -> List[Person]:
     """
@@ -32,6 +37,9 @@ async def persons_search(
     Pagination settings can be passed using 'page[size]' and 'page[number]' parameters,
     default settings are: page size=50, page number=1
 
+    To walk through all results pass the 'X-Next-Cursor' response header
+    of the previous page as 'page[cursor]' instead of 'page[number]'
+
     If 'query' is omitted than all persons with pagination settings will be retrieved
 
     Person information:
@@ -40,20 +48,84 @@ async def persons_search(
     - **role**: person's role
     - **film_ids**: list of films in which a person participated in a particular role
     """
-    persons = await person_service.get_list(query=query, page=page,
-                                            page_size=page_size)
+    try:
+        persons = await person_service.get_list(
+            query=query, page=page, page_size=page_size, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail=BadRequestDetail.CURSOR
+        )
     if not persons:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=NotFoundDetail.PERSONS
         )
 
     persons_list = await person_service.add_person_movies(persons)
-    return persons_list
+    return Page(persons_list, next_cursor=persons.next_cursor)
+
+
+@router.get('/batch', response_model=List[Person],
+            summary='Get persons by ids')
+@authorized
+@cache(raw_response=True, model=Person)
+async def persons_batch(
+        request: Request,
+        ids: List[str] = Query(
+            default=..., alias='id', max_items=settings.BATCH_MAX_SIZE
+        ),
+        person_service: PersonService = Depends(get_person_service)
+) -> List[Person]:
+    """
+    Get information of several persons by their ids passed as 'id'
+    parameters, unknown ids are skipped:
+
+    - **id**: each person has a unique id
+    - **full_name**: person's full_name
+    - **role**: person's role
+    - **film_ids**: list of films in which a person participated in a particular role
+    """
+    persons = await person_service.get_by_ids(ids)
+    if not persons:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail=NotFoundDetail.PERSONS
+        )
+
+    return await person_service.add_person_movies(persons)
+
+
+@router.get('/export', response_class=StreamingResponse,
+            responses={200: {'content': {NDJSON_MEDIA_TYPE: {}}}},
+            summary='Export all persons')
+@authorized
+async def persons_export(
+        request: Request,
+        fields: List[str] | None = Query(default=None, alias='field'),
+        after: str | None = None,
+        person_service: PersonService = Depends(get_person_service)
+) -> StreamingResponse:
+    """
+    Stream all persons in the order of ids as NDJSON, one person per line.
+
+    Fields of the persons can be selected with 'field' parameters,
+    the id is always included, by default all fields are exported.
+
+    To resume an interrupted export pass the id of the last received person
+    as 'after'
+    """
+    try:
+        batches = person_service.export(fields=fields, after=after)
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail=BadRequestDetail.FIELDS
+        )
+
+    return await ndjson_response(batches, NotFoundDetail.PERSONS)
 
 
 @router.get('/{person_id}/film', response_model=List[Film],
             summary="Get all person's films")
-@cache()
+@cache(raw_response=True, model=Film)
 async def person_films(
         request: Request,
         person_id: str,
@@ -66,7 +138,7 @@ async def person_films(
     - **title**: film title
     - **imdb_rating**: rating of the movie
     """
-    films = await film_service.get_list(person=person_id)
+    films = await film_service.get_list(person=person_id, model=Film)
 
     if not films:
         raise HTTPException(
@@ -79,7 +151,7 @@ async def person_films(
 @router.get('/{person_id}', response_model=List[Person],
             summary="Get person by id")
 @authorized
-@cache()
+@cache(raw_response=True, model=Person, id_param='person_id')
 async def person_details(
         request: Request,
         person_id: str,
@@ -1,40 +1,112 @@
+import asyncio
+import itertools
+import json
+import logging
 from functools import wraps
 from http import HTTPStatus
 
 import grpc
+from api.v1.utils.errors import ServiceUnavailableDetail
 from core.config import settings
 from db.redis import get_redis
 from fastapi import HTTPException
 
 import utils.grpc.auth_pb2 as pb2
 import utils.grpc.auth_pb2_grpc as pb2_grpc
+from utils.access_cache import access_cache
+from utils.dataloader import DataLoader
 from utils.access_validation import (
-    is_allowed, async_is_authorized, get_token_from_request
+    is_allowed, async_is_authorized, async_is_token_valid,
+    get_token_from_request
 )
 
+logger = logging.getLogger(__name__)
 
-class AuthClient(object):
+
+class AuthClient:
     """
-    Client for gRPC functionality
+    Asyncio client for gRPC functionality. Calls are spread over a pool of
+    channels, each with its own connection, and retried on UNAVAILABLE
+    within the deadline
     """
 
-    def __init__(self, host='localhost', port=50051):
-        self.host = host
-        self.server_port = port
+    def __init__(self, host='localhost', port=50051, pool_size=1,
+                 timeout=1.0, max_attempts=3, keepalive_time=30,
+                 keepalive_timeout=10, batch=True):
+        self.target = f'{host}:{port}'
+        self.timeout = timeout
+        # concurrent checks of the worker share one BatchHasAccess call
+        self.loader = DataLoader(self._batch_has_access) if batch else None
+
+        service_config = {
+            'methodConfig': [{
+                'name': [{'service': 'grpc_server.Auth'}],
+                'retryPolicy': {
+                    'maxAttempts': max_attempts,
+                    'initialBackoff': '0.05s',
+                    'maxBackoff': '0.5s',
+                    'backoffMultiplier': 2,
+                    'retryableStatusCodes': ['UNAVAILABLE']
+                }
+            }]
+        }
+        options = [
+            ('grpc.enable_retries', 1),
+            ('grpc.service_config', json.dumps(service_config)),
+            ('grpc.keepalive_time_ms', keepalive_time * 1000),
+            ('grpc.keepalive_timeout_ms', keepalive_timeout * 1000),
+            ('grpc.keepalive_permit_without_calls', 1),
+            # channels of the pool must not share one connection
+            ('grpc.use_local_subchannel_pool', 1),
+        ]
+        self.channels = [
+            grpc.aio.insecure_channel(self.target, options=options)
+            for _ in range(pool_size)
+        ]
+        self._stubs = itertools.cycle(
+            [pb2_grpc.AuthStub(channel) for channel in self.channels]
+        )
 
-        self.channel = grpc.insecure_channel(
-            '{}:{}'.format(self.host, self.server_port))
+    async def connect(self):
+        """
+        Establish connections of the pool in advance, the server being
+        down at startup isn't fatal
+        """
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    *(channel.channel_ready() for channel in self.channels)
+                ),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f'gRPC server {self.target} is not ready')
 
-        self.stub = pb2_grpc.AuthStub(self.channel)
+    async def close(self):
+        await asyncio.gather(*(channel.close() for channel in self.channels))
+
+    async def get_auth_response(self, token, roles):
+        if self.loader:
+            return await self.loader.load((token, tuple(roles)))
 
-    def get_auth_response(self, token, roles):
         message = pb2.Message(token=token, roles=roles)
-        return self.stub.HasAccess(message)
+        return await next(self._stubs).HasAccess(message, timeout=self.timeout)
+
+    async def _batch_has_access(self, checks: list) -> dict:
+        batch = pb2.BatchMessage(messages=[
+            pb2.Message(token=token, roles=roles) for token, roles in checks
+        ])
+        response = await next(self._stubs).BatchHasAccess(
+            batch, timeout=self.timeout
+        )
+        return dict(zip(checks, response.responses))
 
 
-grpc_client = AuthClient(
-    host=settings.GRPC_HOST, port=settings.GRPC_PORT
-)
+grpc_client: AuthClient | None = None
+
+
+async def get_grpc_client() -> AuthClient:
+    return grpc_client
 
 
 def authorized(func):
@@ -80,19 +152,48 @@ def has_access(*roles, or_=None, and_=None):
     return wrapper
 
 
+async def get_access(token, roles) -> tuple[bool, str]:
+    """
+    Ask the auth service whether the token has all the roles. Decisions are
+    cached for valid tokens, so revoked tokens are never allowed
+    """
+    if settings.ACCESS_CACHE_ENABLED:
+        redis = await get_redis()
+        valid, payload = await async_is_token_valid(
+            token, settings.JWT_SECRET_KEY, redis
+        )
+        if not valid:
+            return False, payload
+        if decision := await access_cache.get(redis, payload, roles):
+            return decision
+
+    client = await get_grpc_client()
+    try:
+        response = await client.get_auth_response(token=token, roles=roles)
+    except grpc.aio.AioRpcError as e:
+        logger.warning(f'Access check failed: {e.code()}')
+        raise HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail=ServiceUnavailableDetail.AUTH
+        )
+
+    if settings.ACCESS_CACHE_ENABLED:
+        await access_cache.set(
+            redis, payload, roles, response.has_access, response.message
+        )
+    return response.has_access, response.message
+
+
 def strict_verification(*roles, or_=None, and_=None):
     def wrapper(func):
         @wraps(func)
         async def decorator(*args, **kwargs):
             status, response = get_token_from_request(**kwargs)
             if status:
-                response = grpc_client.get_auth_response(
-                    token=response, roles=roles
-                )
-                if response.has_access:
+                has_access, response = await get_access(response, roles)
+                if has_access:
                     return await func(*args, **kwargs)
 
-                response = response.message
             raise HTTPException(
                 status_code=HTTPStatus.FORBIDDEN,
                 detail=str(response)
@@ -5,3 +5,12 @@ class NotFoundDetail:
     PERSONS = 'persons not found'
     GENRE = 'genre not found'
     GENRES = 'genres not found'
+
+
+class BadRequestDetail:
+    CURSOR = 'invalid page cursor'
+    FIELDS = 'unknown fields'
+
+
+class ServiceUnavailableDetail:
+    AUTH = 'auth service is unavailable'
@@ -0,0 +1,35 @@
+from http import HTTPStatus
+from typing import AsyncIterator
+
+import orjson
+from elasticsearch import NotFoundError
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+async def ndjson_response(
+        batches: AsyncIterator[list[dict]], not_found_detail: str
+) -> StreamingResponse:
+    """
+    Stream batches of documents as NDJSON, one document per line.
+    The first batch is fetched before the response is started, so a missing
+    index or an empty export still gets a proper status code
+    """
+    try:
+        first = await batches.__anext__()
+    except (StopAsyncIteration, NotFoundError):
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail=not_found_detail
+        )
+
+    async def lines():
+        try:
+            yield b''.join(orjson.dumps(doc) + b'\n' for doc in first)
+            async for batch in batches:
+                yield b''.join(orjson.dumps(doc) + b'\n' for doc in batch)
+        finally:
+            await batches.aclose()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
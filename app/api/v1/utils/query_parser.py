@@ -4,10 +4,32 @@ from services.base import BaseService
 class QueryParser:
     @staticmethod
     async def parse_params(service: BaseService, **kwargs):
+        """
+        Combine all given parameters into one bool query. Parameters that
+        affect relevance go to 'must', the rest go to 'filter' context,
+        where they aren't scored and are cached by Elasticsearch
+        """
+        must, filters = [], []
         for param, value in kwargs.items():
-            if value:
-                return {'query': await service.get_query(param, value)}
-        return {}
+            if not value:
+                continue
+            clause = await service.get_query(param, value)
+            if not clause:
+                continue
+            if param in service.SCORING_PARAMS:
+                must.append(clause)
+            else:
+                filters.append(clause)
+
+        if not must and not filters:
+            return {}
+
+        query = {}
+        if must:
+            query['must'] = must
+        if filters:
+            query['filter'] = filters
+        return {'query': {'bool': query}}
 
     @staticmethod
     def parse_sort(sort: str | None = None):
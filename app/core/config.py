@@ -15,9 +15,105 @@ class Settings(BaseSettings):
 
     # ELASTICSEARCH
     ELASTIC_URL: str = Field('http://127.0.0.1:9200', env='ES_URL')
+    ES_DATALOADER_ENABLED: bool = Field(True, env='ES_DATALOADER_ENABLED')
+    ES_DATALOADER_MAX_DELAY: float = Field(0, env='ES_DATALOADER_MAX_DELAY')
+    ES_DATALOADER_MAX_BATCH_SIZE: int = Field(
+        100, env='ES_DATALOADER_MAX_BATCH_SIZE'
+    )
+    # connections per node in every worker
+    ES_MAXSIZE: int = Field(10, env='ES_MAXSIZE')
+    ES_HTTP_COMPRESS: bool = Field(False, env='ES_HTTP_COMPRESS')
+    ES_TIMEOUT: float = Field(10, env='ES_TIMEOUT')
+    ES_RETRY_ON_TIMEOUT: bool = Field(True, env='ES_RETRY_ON_TIMEOUT')
+    ES_MAX_RETRIES: int = Field(3, env='ES_MAX_RETRIES')
 
     # REDIS
     REDIS_URL: str = Field('redis://127.0.0.1:6379', env='REDIS_URL')
+    # connections in every worker
+    REDIS_MAX_CONNECTIONS: int = Field(20, env='REDIS_MAX_CONNECTIONS')
+    # how long a request waits for a free connection of the pool
+    REDIS_POOL_TIMEOUT: float = Field(5, env='REDIS_POOL_TIMEOUT')
+    REDIS_SOCKET_TIMEOUT: float = Field(5, env='REDIS_SOCKET_TIMEOUT')
+    # subscribers ping Redis this often and resubscribe after two
+    # intervals without a reply
+    REDIS_HEALTH_CHECK_INTERVAL: int = Field(
+        30, env='REDIS_HEALTH_CHECK_INTERVAL'
+    )
+
+    # METRICS
+    POOL_METRICS_INTERVAL: float = Field(5, env='POOL_METRICS_INTERVAL')
+
+    # CACHE
+    CACHE_STALE_WHILE_REVALIDATE: int = Field(
+        60, env='CACHE_STALE_WHILE_REVALIDATE'
+    )
+    CACHE_STALE_IF_ERROR: int = Field(60 * 10, env='CACHE_STALE_IF_ERROR')
+    LOCAL_CACHE_ENABLED: bool = Field(False, env='LOCAL_CACHE_ENABLED')
+    LOCAL_CACHE_MAX_SIZE: int = Field(1024, env='LOCAL_CACHE_MAX_SIZE')
+    LOCAL_CACHE_TTL: int = Field(10, env='LOCAL_CACHE_TTL')
+    CACHE_INVALIDATION_CHANNEL: str = Field(
+        'cache:invalidation', env='CACHE_INVALIDATION_CHANNEL'
+    )
+    CACHE_COMPRESSION: bool = Field(False, env='CACHE_COMPRESSION')
+    CACHE_COMPRESSION_MIN_SIZE: int = Field(
+        1024, env='CACHE_COMPRESSION_MIN_SIZE'
+    )
+    CACHE_COMPRESSION_LEVEL: int = Field(6, env='CACHE_COMPRESSION_LEVEL')
+    CACHE_NOT_FOUND_EXPIRE: int = Field(30, env='CACHE_NOT_FOUND_EXPIRE')
+    CACHE_TAGS_ENABLED: bool = Field(True, env='CACHE_TAGS_ENABLED')
+    CACHE_LOCK_ENABLED: bool = Field(False, env='CACHE_LOCK_ENABLED')
+    CACHE_LOCK_TIMEOUT: int = Field(5, env='CACHE_LOCK_TIMEOUT')
+    CACHE_LOCK_POLL_INTERVAL: float = Field(
+        0.05, env='CACHE_LOCK_POLL_INTERVAL'
+    )
+
+    # API
+    BATCH_MAX_SIZE: int = Field(100, env='BATCH_MAX_SIZE')
+    # limit of film ids returned for a person in one role
+    PERSON_FILMS_MAX_SIZE: int = Field(1000, env='PERSON_FILMS_MAX_SIZE')
+
+    # EXPORT
+    EXPORT_BATCH_SIZE: int = Field(1000, env='EXPORT_BATCH_SIZE')
+    # how long the point in time is kept between two batches
+    EXPORT_KEEP_ALIVE: str = Field('1m', env='EXPORT_KEEP_ALIVE')
+
+    # CACHE WARMER
+    CACHE_WARMER_ENABLED: bool = Field(True, env='CACHE_WARMER_ENABLED')
+    CACHE_WARMER_INTERVAL: int = Field(60 * 4, env='CACHE_WARMER_INTERVAL')
+    CACHE_WARMER_FILMS_PAGES: int = Field(3, env='CACHE_WARMER_FILMS_PAGES')
+    CACHE_WARMER_FILMS_SORT: str = Field(
+        '-imdb_rating', env='CACHE_WARMER_FILMS_SORT'
+    )
+    CACHE_WARMER_TOP_GENRES: int = Field(5, env='CACHE_WARMER_TOP_GENRES')
+
+    # SIMILAR FILMS
+    SIMILARITY_ENABLED: bool = Field(True, env='SIMILARITY_ENABLED')
+    SIMILARITY_TOP_K: int = Field(50, env='SIMILARITY_TOP_K')
+    SIMILARITY_CANDIDATES_PER_GENRE: int = Field(
+        500, env='SIMILARITY_CANDIDATES_PER_GENRE'
+    )
+    SIMILARITY_RATING_WEIGHT: float = Field(
+        0.5, env='SIMILARITY_RATING_WEIGHT'
+    )
+    SIMILARITY_REBUILD_INTERVAL: int = Field(
+        60 * 60 * 6, env='SIMILARITY_REBUILD_INTERVAL'
+    )
+
+    # BLOOM FILTERS OF DOCUMENT IDS
+    BLOOM_FILTER_ENABLED: bool = Field(False, env='BLOOM_FILTER_ENABLED')
+    BLOOM_FILTER_ERROR_RATE: float = Field(
+        0.01, env='BLOOM_FILTER_ERROR_RATE'
+    )
+    BLOOM_FILTER_REFRESH_INTERVAL: int = Field(
+        60 * 10, env='BLOOM_FILTER_REFRESH_INTERVAL'
+    )
+
+    # ACCESS DECISIONS
+    ACCESS_CACHE_ENABLED: bool = Field(True, env='ACCESS_CACHE_ENABLED')
+    ACCESS_CACHE_TTL: int = Field(30, env='ACCESS_CACHE_TTL')
+    ACCESS_CACHE_MAX_SIZE: int = Field(1024, env='ACCESS_CACHE_MAX_SIZE')
+    # share decisions between workers in Redis
+    ACCESS_CACHE_SHARED: bool = Field(False, env='ACCESS_CACHE_SHARED')
 
     # JWT
     JWT_SECRET_KEY: str = Field(env='JWT_SECRET_KEY')
@@ -25,6 +121,14 @@ class Settings(BaseSettings):
     # gRPC
     GRPC_HOST: str = Field('localhost', env='GRPC_HOST')
     GRPC_PORT: int = Field(50051, env='GRPC_PORT')
+    GRPC_POOL_SIZE: int = Field(4, env='GRPC_POOL_SIZE')
+    # deadline of a call, retries included
+    GRPC_TIMEOUT: float = Field(1, env='GRPC_TIMEOUT')
+    GRPC_MAX_ATTEMPTS: int = Field(3, env='GRPC_MAX_ATTEMPTS')
+    GRPC_KEEPALIVE_TIME: int = Field(30, env='GRPC_KEEPALIVE_TIME')
+    GRPC_KEEPALIVE_TIMEOUT: int = Field(10, env='GRPC_KEEPALIVE_TIMEOUT')
+    # send concurrent access checks with one BatchHasAccess call
+    GRPC_BATCH_ENABLED: bool = Field(True, env='GRPC_BATCH_ENABLED')
 
 
 @lru_cache
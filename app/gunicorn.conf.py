@@ -0,0 +1,17 @@
+import glob
+import os
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # metrics of the workers of a previous run
+    if path := os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        for file in glob.glob(os.path.join(path, '*.db')):
+            os.remove(file)
+
+
+def child_exit(server, worker):
+    # gauges of a dead worker are no longer summed
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,13 +1,27 @@
+import asyncio
+
 import aioredis
 import uvicorn as uvicorn
 from elasticsearch import AsyncElasticsearch
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
+from api import metrics
 from api.v1 import films, genres, persons
+from api.v1.utils import authentication
 from core.config import settings
 from core.logger import LOGGING
 from db import elastic, redis
+from services.films import FilmService
+from services.genres import GenreService
+from services.persons import PersonService
+from services.similarity import run_similarity_builder
+from utils.bloom import refresh_bloom_filters
+from utils.cache_warmer import run_cache_warmer
+from utils.access_cache import listen_for_role_changes
+from utils.local_cache import listen_for_invalidation
+from utils.metrics import run_pool_metrics
+from utils.revocation import listen_for_revocations
 from utils.wait_for_es import check_es_connection
 from utils.wait_for_redis import check_redis_connection
 
@@ -24,20 +38,96 @@ async def startup():
     check_es_connection()
     check_redis_connection()
 
-    pool = aioredis.ConnectionPool.from_url(
+    # requests wait for a free connection instead of failing at once
+    pool = aioredis.BlockingConnectionPool.from_url(
         str(settings.REDIS_URL),
-        max_connections=20
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT
     )
     redis.redis = aioredis.Redis(connection_pool=pool)
-    elastic.es = AsyncElasticsearch(hosts=[f'{settings.ELASTIC_URL}'])
+    # subscribers wait on reads for as long as there are no messages,
+    # so they get a client without a socket timeout. Dead connections are
+    # found by the pings of the subscribers themselves
+    app.state.pubsub_redis = aioredis.Redis.from_url(
+        str(settings.REDIS_URL), socket_keepalive=True
+    )
+    elastic.es = AsyncElasticsearch(
+        hosts=[f'{settings.ELASTIC_URL}'],
+        maxsize=settings.ES_MAXSIZE,
+        http_compress=settings.ES_HTTP_COMPRESS,
+        timeout=settings.ES_TIMEOUT,
+        retry_on_timeout=settings.ES_RETRY_ON_TIMEOUT,
+        max_retries=settings.ES_MAX_RETRIES
+    )
+
+    authentication.grpc_client = authentication.AuthClient(
+        host=settings.GRPC_HOST,
+        port=settings.GRPC_PORT,
+        pool_size=settings.GRPC_POOL_SIZE,
+        timeout=settings.GRPC_TIMEOUT,
+        max_attempts=settings.GRPC_MAX_ATTEMPTS,
+        keepalive_time=settings.GRPC_KEEPALIVE_TIME,
+        keepalive_timeout=settings.GRPC_KEEPALIVE_TIMEOUT,
+        batch=settings.GRPC_BATCH_ENABLED
+    )
+    await authentication.grpc_client.connect()
+
+    app.state.pool_metrics = asyncio.create_task(
+        run_pool_metrics(pool, elastic.es, settings.POOL_METRICS_INTERVAL)
+    )
+    app.state.cache_listener = asyncio.create_task(
+        listen_for_invalidation(
+            app.state.pubsub_redis,
+            heartbeat_interval=settings.REDIS_HEALTH_CHECK_INTERVAL
+        )
+    )
+    app.state.revocation_listener = asyncio.create_task(
+        listen_for_revocations(
+            app.state.pubsub_redis,
+            heartbeat_interval=settings.REDIS_HEALTH_CHECK_INTERVAL
+        )
+    )
+    if settings.ACCESS_CACHE_ENABLED:
+        app.state.access_listener = asyncio.create_task(
+            listen_for_role_changes(
+                app.state.pubsub_redis,
+                heartbeat_interval=settings.REDIS_HEALTH_CHECK_INTERVAL
+            )
+        )
+    if settings.CACHE_WARMER_ENABLED:
+        app.state.cache_warmer = asyncio.create_task(
+            run_cache_warmer(redis.redis, elastic.es)
+        )
+    if settings.SIMILARITY_ENABLED:
+        app.state.similarity_builder = asyncio.create_task(
+            run_similarity_builder(redis.redis, elastic.es)
+        )
+    if settings.BLOOM_FILTER_ENABLED:
+        app.state.bloom_filters = asyncio.create_task(
+            refresh_bloom_filters(
+                elastic.es,
+                [FilmService.INDEX, PersonService.INDEX, GenreService.INDEX]
+            )
+        )
 
 
 @app.on_event('shutdown')
 async def shutdown():
+    app.state.cache_listener.cancel()
+    for task in (
+            'cache_warmer', 'similarity_builder', 'bloom_filters',
+            'pool_metrics', 'revocation_listener', 'access_listener'
+    ):
+        if background_task := getattr(app.state, task, None):
+            background_task.cancel()
+    await authentication.grpc_client.close()
+    await app.state.pubsub_redis.close()
     await redis.redis.close()
     await elastic.es.close()
 
 
+app.include_router(metrics.router, tags=['metrics'])
 app.include_router(films.router, prefix='/api/v1/films', tags=['films'])
 app.include_router(genres.router, prefix='/api/v1/genres', tags=['genres'])
 app.include_router(persons.router, prefix='/api/v1/persons', tags=['persons'])
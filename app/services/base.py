@@ -1,8 +1,38 @@
+import asyncio
 from dataclasses import dataclass
-from typing import Any
+from functools import lru_cache
+from typing import Any, AsyncIterator, Type
 
 from aioredis import Redis
 from elasticsearch import AsyncElasticsearch, NotFoundError
+from pydantic import BaseModel
+
+from core.config import settings
+from utils.bloom import might_exist
+from utils.dataloader import DataLoader
+from utils.metrics import ES_SECONDS
+from utils.pagination import Page, decode_cursor, encode_cursor
+
+# unique sort field that makes the order of documents stable
+TIEBREAKER = 'id:asc'
+
+
+@lru_cache
+def get_source_fields(model: Type[BaseModel]) -> tuple[str, ...]:
+    """
+    Get document fields needed to build the model, nested models included:
+    ('id', 'title', 'genres.id', 'genres.name', ...)
+    """
+    fields = []
+    for name, field in model.__fields__.items():
+        field_type = field.type_
+        if isinstance(field_type, type) and issubclass(field_type, BaseModel):
+            fields.extend(
+                f'{name}.{nested}' for nested in get_source_fields(field_type)
+            )
+        else:
+            fields.append(name)
+    return tuple(fields)
 
 
 @dataclass
@@ -10,49 +40,220 @@ class ElasticSearchManager:
     model: Any
 
     async def get_list(self, sort: str | None = None, page: int | None = 1,
-                       page_size: int | None = 50, **kwargs):
+                       page_size: int | None = 50, cursor: str | None = None,
+                       model: Type[BaseModel] | None = None, **kwargs):
+        """
+        Get a page of documents. Pages are addressed either by number or by
+        the cursor of the previous page, the latter keeps the cost of deep
+        pages constant. Raises ValueError for a malformed cursor
+
+        Only the fields of the model (service model by default) are fetched
+        """
+        model = model or self.model.MODEL
 
         from api.v1.utils.query_parser import QueryParser
+        body = await QueryParser.parse_params(self.model, **kwargs)
+        sort = [
+            QueryParser.parse_sort(sort) if sort else '_score:desc',
+            TIEBREAKER
+        ]
+        if cursor:
+            body['search_after'] = decode_cursor(cursor, sort)
+            from_ = None
+        else:
+            from_ = page_size * (page - 1)
+
         try:
-            doc = await self.model.elastic.search(
-                index=self.model.INDEX,
-                body=await QueryParser.parse_params(self.model, **kwargs),
-                from_=page_size * (page - 1),
-                size=page_size,
-                sort=QueryParser.parse_sort(sort) if sort else None
-            )
+            with ES_SECONDS.labels(self.model.INDEX, 'search').time():
+                doc = await self.model.elastic.search(
+                    index=self.model.INDEX,
+                    body=body,
+                    from_=from_,
+                    size=page_size,
+                    track_total_hits=False,
+                    _source_includes=get_source_fields(model),
+                    sort=sort
+                )
         except NotFoundError:
             return None
 
-        return [self.model.MODEL(**item['_source']) for item in
-                doc['hits']['hits']]
+        hits = doc['hits']['hits']
+        next_cursor = (
+            encode_cursor(hits[-1]['sort'], sort) if len(hits) == page_size
+            else None
+        )
+        return Page(
+            [model(**item['_source']) for item in hits],
+            next_cursor=next_cursor
+        )
+
+    def export(self, fields: list[str] | None = None,
+               after: str | None = None) -> AsyncIterator[list[dict]]:
+        """
+        Iterate over batches of all documents in the order of ids, starting
+        after the given id. Only the given fields (all model fields by
+        default) and the id are fetched.
+        Raises ValueError for fields unknown to the model
+        """
+        available = get_source_fields(self.model.MODEL)
+        if not fields:
+            return self._export(available, after)
+
+        unknown = [
+            field for field in fields
+            if not any(
+                name == field or name.startswith(f'{field}.')
+                for name in available
+            )
+        ]
+        if unknown:
+            raise ValueError(f'Unknown fields: {unknown}')
+        return self._export(tuple(dict.fromkeys(['id', *fields])), after)
+
+    async def _export(self, fields: tuple[str, ...],
+                      after: str | None) -> AsyncIterator[list[dict]]:
+        """
+        Walk the index with search_after within a point in time, so the
+        export sees one snapshot and deep batches cost the same as the
+        first one. The next batch is fetched while the current one is
+        being sent, so at most two batches are held in memory
+        """
+        elastic, index = self.model.elastic, self.model.INDEX
+        keep_alive = settings.EXPORT_KEEP_ALIVE
+        batch_size = settings.EXPORT_BATCH_SIZE
+
+        # the client has no point in time API yet
+        pit = await elastic.transport.perform_request(
+            'POST', f'/{index}/_pit', params={'keep_alive': keep_alive}
+        )
+        pit_id = pit['id']
+
+        async def search(search_after):
+            body = {
+                'size': batch_size,
+                'pit': {'id': pit_id, 'keep_alive': keep_alive},
+                'sort': [TIEBREAKER],
+                'track_total_hits': False,
+                '_source': list(fields)
+            }
+            if search_after:
+                body['search_after'] = search_after
+            with ES_SECONDS.labels(index, 'export').time():
+                return await elastic.search(body=body)
+
+        next_batch = asyncio.create_task(search([after] if after else None))
+        try:
+            while next_batch:
+                doc = await next_batch
+                pit_id = doc.get('pit_id', pit_id)
+                hits = doc['hits']['hits']
+                next_batch = (
+                    asyncio.create_task(search(hits[-1]['sort']))
+                    if len(hits) == batch_size else None
+                )
+                if hits:
+                    yield [hit['_source'] for hit in hits]
+        finally:
+            if next_batch:
+                next_batch.cancel()
+            await elastic.transport.perform_request(
+                'DELETE', '/_pit', body={'id': pit_id}
+            )
 
     async def get_by_id(self, _id):
         try:
-            doc = await self.model.elastic.get(self.model.INDEX, _id)
+            with ES_SECONDS.labels(self.model.INDEX, 'get').time():
+                doc = await self.model.elastic.get(self.model.INDEX, _id)
         except NotFoundError:
             return None
         return self.model.MODEL(**doc['_source'])
 
+    async def get_by_ids(self, ids) -> dict:
+        """
+        Get documents by ids with one request, missing ones are skipped
+        """
+        if not ids:
+            return {}
+        try:
+            with ES_SECONDS.labels(self.model.INDEX, 'mget').time():
+                doc = await self.model.elastic.mget(
+                    index=self.model.INDEX, body={'ids': list(ids)}
+                )
+        except NotFoundError:
+            return {}
+        return {
+            item['_id']: self.model.MODEL(**item['_source'])
+            for item in doc['docs'] if item.get('found')
+        }
+
 
 class BaseService:
     INDEX = None
     MODEL = None
+    # query parameters that take part in scoring, others only filter
+    SCORING_PARAMS = ('query',)
 
     def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
         self.redis = redis
         self.elastic = elastic
+        # concurrent get_by_id calls of the worker share one mget
+        self.loader = DataLoader(
+            self.es_manager.get_by_ids,
+            max_delay=settings.ES_DATALOADER_MAX_DELAY,
+            max_batch_size=settings.ES_DATALOADER_MAX_BATCH_SIZE
+        )
 
     async def get_query(self, param, value):
         query = getattr(self, param)(value)
         return query.to_dict() if query else None
 
+    def get_cache_tags(self, data) -> set[tuple[str, str]]:
+        """
+        Get (index, id) pairs of all documents the result depends on
+        """
+        items = data if isinstance(data, list) else [data]
+        tags = set()
+        for item in items:
+            tags.add((self.INDEX, item.id))
+            tags.update(self.get_related_tags(item))
+        return tags
+
+    def get_related_tags(self, item) -> set[tuple[str, str]]:
+        return set()
+
     @property
     def es_manager(self):
         return ElasticSearchManager(self)
 
     async def get_by_id(self, _id):
+        if not might_exist(self.INDEX, _id):
+            return None
+        if settings.ES_DATALOADER_ENABLED:
+            return await self.loader.load(_id)
         return await self.es_manager.get_by_id(_id)
 
+    async def get_by_ids(self, ids, cache=None) -> list:
+        """
+        Get documents in the order of ids, missing ones are skipped.
+        With the cache of the detail endpoint its per-id entries are read
+        with one MGET and the rest is fetched with one mget and stored back
+        """
+        ids = [
+            _id for _id in dict.fromkeys(ids) if might_exist(self.INDEX, _id)
+        ]
+
+        documents = await cache.get_many(self, ids) if cache else {}
+        missing = [_id for _id in ids if _id not in documents]
+        if missing:
+            fetched = await self.es_manager.get_by_ids(missing)
+            if cache and fetched:
+                await cache.set_many(self, fetched)
+            documents.update(fetched)
+
+        return [documents[_id] for _id in ids if _id in documents]
+
     async def get_list(self, **kwargs):
         return await self.es_manager.get_list(**kwargs)
+
+    def export(self, **kwargs) -> AsyncIterator[list[dict]]:
+        return self.es_manager.export(**kwargs)
@@ -2,20 +2,24 @@ import sys
 from functools import lru_cache
 
 from aioredis import Redis
-from elasticsearch import NotFoundError, AsyncElasticsearch
+from elasticsearch import AsyncElasticsearch
 from elasticsearch_dsl import Q
 from fastapi import Depends
 
 sys.path.append('.')
+from core.config import settings
 from db.elastic import get_elastic
 from db.redis import get_redis
-from api.v1.models import Film
+from api.v1.models import FilmDetails
 from services.base import BaseService
+from services.similarity import SimilarityEngine
+from utils.metrics import ES_SECONDS
 
 
 class FilmService(BaseService):
     INDEX = 'movies'
-    MODEL = Film
+    MODEL = FilmDetails
+    SCORING_PARAMS = ('query', 'similar_to')
 
     async def get_query(self, param, value):
         if param == 'similar_to':
@@ -48,22 +52,131 @@ class FilmService(BaseService):
             ]
         )
 
+    async def get_top_genres(self, size: int) -> list[str]:
+        """
+        Get ids of the genres with the largest number of films
+        """
+        with ES_SECONDS.labels(self.INDEX, 'aggregation').time():
+            doc = await self.elastic.search(
+                index=self.INDEX,
+                body={
+                    'size': 0,
+                    'track_total_hits': False,
+                    'aggs': {
+                        'genres': {
+                            'nested': {'path': 'genres'},
+                            'aggs': {
+                                'top': {
+                                    'terms': {
+                                        'field': 'genres.id', 'size': size
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            )
+        buckets = doc['aggregations']['genres']['top']['buckets']
+        return [bucket['key'] for bucket in buckets]
+
+    async def get_person_films(
+            self, person_ids: list[str], size: int | None = None
+    ) -> dict[str, dict[str, list[str]]]:
+        """
+        Get ids of the films of the persons by role with one aggregation:
+        {person_id: {'actors': [film_id, ...], ...}}
+
+        For every role the nested person entries are grouped by person id
+        and joined back to their films, so the film lists are complete
+        regardless of the page size of the films search
+        """
+        size = size or settings.PERSON_FILMS_MAX_SIZE
+        films = {
+            'reverse_nested': {},
+            'aggs': {
+                'ids': {
+                    'terms': {
+                        'field': 'id', 'size': size, 'order': {'_key': 'asc'}
+                    }
+                }
+            }
+        }
+        aggs = {
+            role: {
+                'nested': {'path': role},
+                'aggs': {
+                    'persons': {
+                        'filter': {'terms': {f'{role}.id': person_ids}},
+                        'aggs': {
+                            'ids': {
+                                'terms': {
+                                    'field': f'{role}.id',
+                                    'size': len(person_ids)
+                                },
+                                'aggs': {'films': films}
+                            }
+                        }
+                    }
+                }
+            }
+            for role in ('actors', 'writers', 'directors')
+        }
+        with ES_SECONDS.labels(self.INDEX, 'aggregation').time():
+            doc = await self.elastic.search(
+                index=self.INDEX,
+                body={
+                    'size': 0,
+                    'track_total_hits': False,
+                    'query': self.person(person_ids).to_dict(),
+                    'aggs': aggs
+                }
+            )
+
+        person_films = {}
+        for role, aggregation in doc['aggregations'].items():
+            for person in aggregation['persons']['ids']['buckets']:
+                person_films.setdefault(person['key'], {})[role] = [
+                    film['key'] for film in person['films']['ids']['buckets']
+                ]
+        return person_films
+
+    def get_related_tags(self, item) -> set[tuple[str, str]]:
+        genres = getattr(item, 'genres', None) or []
+        tags = {('genres', genre.id) for genre in genres}
+        for role in ('actors', 'writers', 'directors'):
+            persons = getattr(item, role, None) or []
+            tags.update(('persons', person.id) for person in persons)
+        return tags
+
+    @property
+    def similarity(self):
+        return SimilarityEngine(self.redis, self.elastic, self.INDEX)
+
     async def similar_to(self, similar):
-        try:
-            doc = await self.get_by_id(similar)
-        except NotFoundError:
-            return None
-        if not doc:
-            return None
-
-        genres = [genre.id for genre in doc.genres]
+        """
+        Films with precomputed similarity are looked up by ids, boosted by
+        rank so that the most similar come first. Otherwise films sharing
+        genres with the film are found with a terms lookup, without
+        fetching the film itself
+        """
+        similar_ids = await self.similarity.get_similar(similar)
+        if similar_ids is not None:
+            return Q(
+                'bool', should=[
+                    Q('ids', values=[film_id], boost=len(similar_ids) - rank)
+                    for rank, film_id in enumerate(similar_ids)
+                ], minimum_should_match=1
+            ).to_dict()
+
         query = Q(
             'bool', must=Q(
                 "nested", path='genres',
-                query=Q('terms', genres__id=genres)
+                query=Q('terms', genres__id={
+                    'index': self.INDEX, 'id': similar, 'path': 'genres.id'
+                })
             )
         ) & Q(
-            'bool', must_not=Q('match', id=similar)
+            'bool', must_not=Q('ids', values=[similar])
         )
         return query.to_dict()
 
@@ -11,6 +11,9 @@ from db.redis import get_redis
 from api.v1.models import Person
 from services.base import BaseService
 
+# roles in the films index and their names in the person model
+ROLES = (('directors', 'director'), ('writers', 'writer'), ('actors', 'actor'))
+
 
 class PersonService(BaseService):
     INDEX = 'persons'
@@ -20,67 +23,37 @@ class PersonService(BaseService):
     def query(self):
         return lambda query: Q('match', full_name={'query': query})
 
+    def get_related_tags(self, item) -> set[tuple[str, str]]:
+        return {('movies', str(film_id)) for film_id in item.film_ids or []}
+
     async def add_person_movies(
             self, persons: Person | List[Person]
-    ) -> List[Person] | None:
-
+    ) -> List[Person]:
+        """
+        Split persons by roles with the ids of their films in each role.
+        Persons without films are returned as is only if nobody has films
+        """
         from services.films import FilmService
         film_service = FilmService(self.redis, self.elastic)
 
         if isinstance(persons, Person):
             persons = [persons]
 
-        persons_data = {person.id: person.full_name for person in persons}
-
         try:
-            films = await film_service.get_list(person=list(persons_data))
+            person_films = await film_service.get_person_films(
+                [person.id for person in persons]
+            )
         except NotFoundError:
-            return None
-
-        if not films:
             return persons
 
-        persons_films = []
-        for p_id, p_name in persons_data.items():
-            self._set_films_to_person(persons_films, p_id, p_name, films)
-
-        if not persons_films:
-            return persons
-
-        return persons_films
-
-    def _set_films_to_person(
-            self,
-            persons_films: list,
-            person_id: str,
-            person_name: str,
-            films: dict
-    ) -> None:
-        """
-        Parse films ids by roles for person id and add them to general list
-        of persons films
-        """
-
-        roles = {
-            ('directors', 'director'): [],
-            ('writers', 'writer'): [],
-            ('actors', 'actor'): []
-        }
-
-        def check_func(item):
-            return item.id == person_id
-
-        for film in films:
-            for role in roles:
-                if list(filter(check_func, getattr(film, role[0]))):
-                    roles[role].append(film.id)
-
-        for role in roles:
-            if roles[role]:
-                persons_films.append(
-                    Person(id=person_id, full_name=person_name,
-                           role=role[1], film_ids=roles[role])
-                )
+        persons_films = [
+            Person(id=person.id, full_name=person.full_name,
+                   role=role, film_ids=film_ids)
+            for person in persons
+            for films_role, role in ROLES
+            if (film_ids := person_films.get(person.id, {}).get(films_role))
+        ]
+        return persons_films or persons
 
 
 @lru_cache()
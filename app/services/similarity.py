@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import orjson
+from aioredis import Redis, RedisError
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_LOCK_KEY = 'lock:similarity'
+
+
+def get_similar_key(film_id: str) -> str:
+    return f'similar:{film_id}'
+
+
+def compute_similar(films: dict[str, tuple[set, float]], top_k: int,
+                    candidates_per_genre: int, rating_weight: float) -> dict:
+    """
+    Get top_k similar films for every film.
+    Score is the Jaccard index of genres plus the weighted rating,
+    candidates are the best rated films of every genre of the film
+
+    :param films: film id -> (genre ids, imdb rating)
+    :return: film id -> similar film ids, the most similar first
+    """
+    by_genre = defaultdict(list)
+    for film_id, (genres, rating) in films.items():
+        for genre in genres:
+            by_genre[genre].append((rating, film_id))
+
+    candidates = {
+        genre: [
+            film_id for _, film_id in
+            heapq.nlargest(candidates_per_genre, genre_films)
+        ]
+        for genre, genre_films in by_genre.items()
+    }
+
+    similar = {}
+    for film_id, (genres, _) in films.items():
+        scores = {}
+        for genre in genres:
+            for candidate in candidates[genre]:
+                if candidate == film_id or candidate in scores:
+                    continue
+                candidate_genres, rating = films[candidate]
+                jaccard = (
+                    len(genres & candidate_genres)
+                    / len(genres | candidate_genres)
+                )
+                scores[candidate] = jaccard + rating_weight * rating / 10
+
+        similar[film_id] = heapq.nlargest(top_k, scores, key=scores.get)
+    return similar
+
+
+@dataclass
+class SimilarityEngine:
+    redis: Redis
+    elastic: AsyncElasticsearch
+    index: str = 'movies'
+
+    async def get_similar(self, film_id: str) -> list[str] | None:
+        """
+        Get precomputed similar film ids, None if they aren't computed yet
+        or Redis is unavailable
+        """
+        try:
+            data = await self.redis.get(get_similar_key(film_id))
+        except RedisError as e:
+            logger.warning(f'Failed to get similar films of {film_id}: {e}')
+            return None
+        return orjson.loads(data) if data else None
+
+    async def rebuild(self) -> None:
+        films = {}
+        async for hit in async_scan(
+                self.elastic, index=self.index,
+                query={'_source': ['genres.id', 'imdb_rating']}
+        ):
+            source = hit['_source']
+            films[hit['_id']] = (
+                {genre['id'] for genre in source.get('genres') or []},
+                source.get('imdb_rating') or 0
+            )
+
+        # pure Python, in a thread it would still hold the GIL and stall
+        # the event loop of the worker
+        with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            similar = await asyncio.get_running_loop().run_in_executor(
+                executor, compute_similar, films, settings.SIMILARITY_TOP_K,
+                settings.SIMILARITY_CANDIDATES_PER_GENRE,
+                settings.SIMILARITY_RATING_WEIGHT
+            )
+
+        # entries live until the rebuild after next
+        expire = settings.SIMILARITY_REBUILD_INTERVAL * 2
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for film_id, similar_ids in similar.items():
+                pipe.setex(
+                    get_similar_key(film_id), expire, orjson.dumps(similar_ids)
+                )
+            await pipe.execute()
+        logger.info(f'Similar films are computed for {len(similar)} films')
+
+
+async def run_similarity_builder(redis: Redis, elastic: AsyncElasticsearch):
+    """
+    Recompute similar films on startup and then every
+    SIMILARITY_REBUILD_INTERVAL seconds in one of the workers
+    """
+    engine = SimilarityEngine(redis, elastic)
+    while True:
+        try:
+            if await redis.set(SIMILARITY_LOCK_KEY, 1, nx=True,
+                               ex=settings.SIMILARITY_REBUILD_INTERVAL):
+                await engine.rebuild()
+        except Exception as e:
+            logger.warning(f'Similar films computation failed: {e}')
+        await asyncio.sleep(settings.SIMILARITY_REBUILD_INTERVAL)
@@ -0,0 +1,123 @@
+import logging
+import time
+from collections import OrderedDict
+
+import orjson
+from aioredis import Redis, RedisError
+
+from core.config import settings
+from utils.access_events import (
+    ALL_USERS, ROLES_CHANGED_CHANNEL, get_access_key
+)
+from utils.pubsub import HEARTBEAT_INTERVAL, subscribe
+
+logger = logging.getLogger(__name__)
+
+
+class AccessCache:
+    """
+    HasAccess decisions by token and required roles, kept in process and
+    optionally shared between workers in Redis. Decisions live no longer
+    than the token and are dropped when roles of the user change
+    """
+
+    def __init__(self, max_size: int, ttl: int, shared: bool = False):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._data = OrderedDict()
+
+    @staticmethod
+    def get_field(jti: str, roles) -> str:
+        return f'{jti}:{",".join(sorted(roles))}'
+
+    async def get(self, redis: Redis, payload: dict,
+                  roles) -> tuple[bool, str] | None:
+        user_id = payload['sub']['user_id']
+        key = (user_id, self.get_field(payload['jti'], roles))
+
+        item = self._data.get(key)
+        if item is not None:
+            if item[0] > time.time():
+                self._data.move_to_end(key)
+                return item[1], item[2]
+            del self._data[key]
+
+        if not self.shared:
+            return None
+        try:
+            value = await redis.hget(get_access_key(user_id), key[1])
+        except RedisError as e:
+            logger.warning(f'Failed to get access decision: {e}')
+            return None
+        if value is None:
+            return None
+
+        expires_at, has_access, message = orjson.loads(value)
+        if expires_at <= time.time():
+            return None
+        self._set_local(key, expires_at, has_access, message)
+        return has_access, message
+
+    async def set(self, redis: Redis, payload: dict, roles,
+                  has_access: bool, message: str) -> None:
+        user_id = payload['sub']['user_id']
+        key = (user_id, self.get_field(payload['jti'], roles))
+        expires_at = min(time.time() + self.ttl, payload['exp'])
+        self._set_local(key, expires_at, has_access, message)
+
+        if not self.shared:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.hset(
+                get_access_key(user_id), key[1],
+                orjson.dumps([expires_at, has_access, message])
+            )
+            pipe.expire(get_access_key(user_id), self.ttl)
+            await pipe.execute()
+        except RedisError as e:
+            logger.warning(f'Failed to set access decision: {e}')
+
+    def invalidate(self, user_id: str = ALL_USERS) -> None:
+        if user_id == ALL_USERS:
+            self._data.clear()
+            return
+        for key in [key for key in self._data if key[0] == user_id]:
+            del self._data[key]
+
+    def _set_local(self, key: tuple[str, str], expires_at: float,
+                   has_access: bool, message: str) -> None:
+        self._data[key] = (expires_at, has_access, message)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+access_cache = AccessCache(
+    max_size=settings.ACCESS_CACHE_MAX_SIZE,
+    ttl=settings.ACCESS_CACHE_TTL,
+    shared=settings.ACCESS_CACHE_SHARED
+)
+
+
+def handle_role_change(message: bytes | str) -> None:
+    if isinstance(message, bytes):
+        message = message.decode()
+    access_cache.invalidate(message)
+
+
+async def listen_for_role_changes(
+        redis: Redis, reconnect_delay: float = 1,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL
+):
+    """
+    Drop decisions of the users whose roles were changed. Changes missed
+    while unsubscribed are unknown, so all decisions are dropped on every
+    subscription
+    """
+    await subscribe(
+        redis, ROLES_CHANGED_CHANNEL, handle_role_change,
+        on_subscribe=access_cache.invalidate,
+        reconnect_delay=reconnect_delay, heartbeat_interval=heartbeat_interval
+    )
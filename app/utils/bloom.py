@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import logging
+import math
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Probabilistic set of strings: no false negatives,
+    false positives with the given probability
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(item)
+        )
+
+
+# filters of known document ids by index
+bloom_filters: dict[str, BloomFilter] = {}
+
+
+def might_exist(index: str, _id: str) -> bool:
+    """
+    False only if the id is surely not in the index.
+    Without a filter for the index every id might exist
+    """
+    bloom_filter = bloom_filters.get(index)
+    return bloom_filter is None or _id in bloom_filter
+
+
+async def build_bloom_filter(es: AsyncElasticsearch, index: str) -> BloomFilter:
+    count = (await es.count(index=index))['count']
+    # leave room for documents added before the next rebuild
+    bloom_filter = BloomFilter(
+        capacity=int(count * 1.1), error_rate=settings.BLOOM_FILTER_ERROR_RATE
+    )
+    async for hit in async_scan(es, index=index, query={'_source': False}):
+        bloom_filter.add(hit['_id'])
+    return bloom_filter
+
+
+async def refresh_bloom_filters(es: AsyncElasticsearch, indexes):
+    """
+    Rebuild filters of the indexes from Elasticsearch periodically.
+    Documents created between rebuilds are reported as missing
+    until the next rebuild
+    """
+    while True:
+        for index in indexes:
+            try:
+                bloom_filters[index] = await build_bloom_filter(es, index)
+            except Exception as e:
+                # without a fresh filter it's safer to check every id
+                bloom_filters.pop(index, None)
+                logger.warning(f'Bloom filter of {index} is not built: {e}')
+        await asyncio.sleep(settings.BLOOM_FILTER_REFRESH_INTERVAL)
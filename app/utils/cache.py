@@ -1,69 +1,629 @@
-import json
-from functools import wraps
-from typing import List
+import asyncio
+import hashlib
+import inspect
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from functools import partial, wraps
+from http import HTTPStatus
+from typing import Any, NamedTuple, Type
 
+import orjson
 from aioredis import Redis
-from fastapi import Request
+from elasticsearch import ElasticsearchException
+from fastapi import HTTPException, Request, Response, params
 from pydantic import BaseModel
+from pydantic.fields import FieldInfo
+
+from core.config import settings
 from services.base import BaseService
+from utils import codecs
+from utils.bloom import might_exist
+from utils.pagination import NEXT_CURSOR_HEADER, with_cursor
+from utils.metrics import (
+    CACHE_ERRORS, CACHE_HITS, CACHE_MISSES, CACHE_PAYLOAD_BYTES,
+    CACHE_SERIALIZATION_SECONDS, REDIS_SECONDS
+)
+from utils.local_cache import (
+    GENERATION_PREFIX, generations, local_cache, publish_invalidation
+)
+
+logger = logging.getLogger(__name__)
 
+# bump to make every existing cache key unreachable after a format change
+KEY_VERSION = 1
 
-def get_cache_key(kwargs):
-    cache_key = ''
-    service = BaseService
 
-    for key, value in kwargs.items():
+def get_service(kwargs) -> BaseService | None:
+    for value in kwargs.values():
         if isinstance(value, BaseService):
-            service = value
+            return value
+    return None
+
+
+def get_param_defaults(function) -> dict:
+    """
+    Get default values of the endpoint parameters, unwrapping FastAPI
+    Query/Path declarations and skipping dependencies
+    """
+    defaults = {}
+    for name, param in inspect.signature(function).parameters.items():
+        default = param.default
+        if isinstance(default, params.Depends):
             continue
-        if isinstance(value, Request):
+        if isinstance(default, FieldInfo):
+            default = default.default
+        if default in (inspect.Parameter.empty, Ellipsis):
             continue
-        cache_key += f'{key}:{value};'
-    return service.INDEX + cache_key if service.INDEX else cache_key, service
+        defaults[name] = default
+    return defaults
+
+
+def get_cache_params(kwargs, defaults: dict) -> dict:
+    """
+    Normalize endpoint parameters: services, requests and responses are
+    skipped, as are empty values and values equal to the defaults
+    """
+    return {
+        key: value for key, value in sorted(kwargs.items())
+        if value is not None
+        and not isinstance(value, (BaseService, Request, Response))
+        and not (key in defaults and defaults[key] == value)
+    }
+
+
+def hash_params(cache_params: dict) -> str:
+    data = orjson.dumps(cache_params, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def get_key_prefix(cache_key: str) -> str:
+    return cache_key.partition(':')[0]
+
+
+@contextmanager
+def redis_errors(route: str, key: str, operation: str):
+    """
+    The cache being unavailable only costs the cache: the failure is counted
+    and logged, and the request goes on to Elasticsearch
+    """
+    try:
+        yield
+    except Exception as e:
+        CACHE_ERRORS.labels(route, get_key_prefix(key), operation).inc()
+        logger.warning(f'Cache {operation} of {key} failed: {e}')
+
+
+def get_generation_key(index: str) -> str:
+    return f'cache:generation:{index}'
+
+
+async def get_generation(redis: Redis, index: str) -> int:
+    """
+    If Redis fails the generation is taken as 0 for this request only.
+    Entries written with it are unreachable once the real one is known
+    """
+    generation = generations.get(index)
+    if generation is not None:
+        return generation
+
+    key = get_generation_key(index)
+    with redis_errors('generation', key, 'get'):
+        generation = int(await redis.get(key) or 0)
+        generations[index] = generation
+        return generation
+    return 0
+
+
+async def bump_generation(redis: Redis, index: str) -> int:
+    """
+    Invalidate all cache entries of the index at once
+    """
+    generation = await redis.incr(get_generation_key(index))
+    generations[index] = generation
+    await publish_invalidation(redis, GENERATION_PREFIX + index)
+    return generation
+
+
+def get_tag_key(index: str, _id: str) -> str:
+    return f'cache:tags:{index}:{_id}'
+
+
+def tag_in_pipeline(pipe, cache_key: str, tags, expire: int) -> None:
+    """
+    Queue adding the cache key to the tag set of every document it
+    contains. Members are scored by the expiration time of the entry and
+    expired ones are trimmed on every write, so a tag set only holds keys
+    of live entries
+    """
+    now = time.time()
+    for index, _id in tags:
+        tag_key = get_tag_key(index, _id)
+        pipe.zadd(tag_key, {cache_key: now + expire})
+        pipe.zremrangebyscore(tag_key, '-inf', now)
+        pipe.expire(tag_key, expire)
+
+
+async def add_tags(redis: Redis, cache_key: str, tags, expire: int) -> None:
+    """
+    Remember the cache key in the tag set of every document it contains
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        tag_in_pipeline(pipe, cache_key, tags, expire)
+        await pipe.execute()
+
+
+async def purge(redis: Redis, index: str, ids) -> int:
+    """
+    Delete the cache entries that contain any of the documents
+    """
+    tag_keys = [get_tag_key(index, _id) for _id in ids]
+    now = time.time()
+    async with redis.pipeline(transaction=False) as pipe:
+        for tag_key in tag_keys:
+            pipe.zrangebyscore(tag_key, now, '+inf')
+        members = await pipe.execute()
+
+    cache_keys = [key.decode() for key in set().union(*members)]
+    await redis.delete(*cache_keys, *tag_keys)
+    if cache_keys:
+        await publish_invalidation(redis, *cache_keys)
+    return len(cache_keys)
+
+
+async def get_cache_key(
+        service: BaseService, namespace: str, cache_params: dict
+) -> str:
+    index = service.INDEX or 'cache'
+    generation = await get_generation(service.redis, index)
+    return (
+        f'{index}:v{KEY_VERSION}:g{generation}:{namespace}:'
+        f'{hash_params(cache_params)}'
+    )
+
+
+def get_lock_key(cache_key: str) -> str:
+    return f'lock:{cache_key}'
+
+
+class CacheEntry(NamedTuple):
+    data: Any
+    fresh_until: float
+    stale_until: float
+    not_found: bool = False
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.fresh_until
+
+    def is_stale(self) -> bool:
+        return self.fresh_until <= time.time() < self.stale_until
 
 
 class cache:
     CACHE_EXPIRE_IN_SECONDS = 60 * 5
+    RELEASE_LOCK_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    # cache misses being computed in this worker, shared by all endpoints
+    _in_flight: dict[str, asyncio.Task] = {}
 
-    def __init__(self, *args, **kwargs):
-        self.cache_args = args
-        self.cache_kwargs = kwargs
+    def __init__(
+            self,
+            expire: int = CACHE_EXPIRE_IN_SECONDS,
+            stale_while_revalidate: int | None = None,
+            stale_if_error: int | None = None,
+            local: bool | None = None,
+            lock: bool | None = None,
+            raw_response: bool = False,
+            model: Type[BaseModel] | None = None,
+            id_param: str | None = None
+    ):
+        """
+        :param expire: soft TTL, the entry is fresh during this time
+        :param stale_while_revalidate: time after the soft TTL while the
+        stale entry is served and refreshed in the background, the hard TTL
+        is expire + stale_while_revalidate
+        :param stale_if_error: time after the hard TTL while the stale entry
+        is served if Elasticsearch fails
+        :param local: keep results in the per-worker in-memory tier as well,
+        defaults to LOCAL_CACHE_ENABLED setting
+        :param lock: take a Redis lock on a miss so that only one worker
+        recomputes the key, defaults to CACHE_LOCK_ENABLED setting
+        :param raw_response: cache the encoded response body and return it as
+        a raw Response, so a hit skips model construction and validation
+        :param model: response item model, defaults to the service model
+        :param id_param: name of the document id parameter of a detail
+        endpoint, ids that are surely missing from the service index
+        go straight to the endpoint without a cache lookup
+        """
+        self.expire = expire
+        self.stale_while_revalidate = (
+            settings.CACHE_STALE_WHILE_REVALIDATE
+            if stale_while_revalidate is None else stale_while_revalidate
+        )
+        self.stale_if_error = (
+            settings.CACHE_STALE_IF_ERROR
+            if stale_if_error is None else stale_if_error
+        )
+        self.local = settings.LOCAL_CACHE_ENABLED if local is None else local
+        self.lock = settings.CACHE_LOCK_ENABLED if lock is None else lock
+        self.raw_response = raw_response
+        self.model = model
+        self.id_param = id_param
+        self.name = None
+        self.defaults = {}
+
+    @property
+    def ttl(self) -> int:
+        return self.expire + self.stale_while_revalidate + self.stale_if_error
 
     def __call__(self, function):
+        defaults = get_param_defaults(function)
+        self.name = function.__name__
+        self.defaults = defaults
+
         @wraps(function)
         async def wrapper(*args, **kwargs):
-            cache_key, service = get_cache_key(kwargs)
+            service = get_service(kwargs)
+            if self.id_param and not might_exist(service.INDEX,
+                                                 kwargs[self.id_param]):
+                return await function(*args, **kwargs)
 
-            cache_result = await self._get_from_cache(service.redis, cache_key,
-                                                      service.MODEL)
-            if cache_result:
-                return cache_result
+            cache_key = await get_cache_key(
+                service, function.__name__, get_cache_params(kwargs, defaults)
+            )
+            load = partial(self._load, service, cache_key, function,
+                           *args, **kwargs)
 
-            result = await function(*args, **kwargs)
-            await self._set_to_cache(service.redis, cache_key,
-                                     result, service.MODEL)
-            return result
+            prefix = get_key_prefix(cache_key)
+
+            if self.local:
+                cache_result = local_cache.get(cache_key)
+                if cache_result is not None:
+                    CACHE_HITS.labels(self.name, prefix, 'local').inc()
+                    return self._to_response(cache_result)
+
+            entry = await self._get_from_cache(service.redis, cache_key,
+                                               self._get_model(service))
+            if entry and entry.is_fresh():
+                CACHE_HITS.labels(self.name, prefix, 'redis').inc()
+                data = self._unpack(entry)
+                if self.local:
+                    local_cache.set(cache_key, data)
+                return self._to_response(data)
+
+            if entry and entry.is_stale():
+                CACHE_HITS.labels(self.name, prefix, 'stale').inc()
+                self._revalidate(cache_key, load)
+                return self._to_response(entry.data)
+
+            CACHE_MISSES.labels(self.name, prefix).inc()
+            try:
+                result = await self._single_flight(cache_key, load)
+            except ElasticsearchException as e:
+                if not entry or entry.not_found:
+                    raise
+                logger.warning(f'Serving stale {cache_key} after error: {e}')
+                result = entry.data
 
+            return self._to_response(result)
+
+        async def warm(**kwargs):
+            """
+            Recompute and store the entry for the parameters bypassing the
+            lookup and the endpoint authorization. Parameters that are not
+            passed get their defaults, the service has to be passed
+            """
+            kwargs = {
+                name: kwargs.get(name, defaults.get(name))
+                for name in inspect.signature(function).parameters
+            }
+            service = get_service(kwargs)
+            cache_key = await get_cache_key(
+                service, self.name, get_cache_params(kwargs, defaults)
+            )
+            await self._single_flight(
+                cache_key,
+                partial(self._compute, service, cache_key, function, **kwargs)
+            )
+
+        # outer decorators copy them with functools.wraps
+        wrapper.warm = warm
+        wrapper.cache = self
         return wrapper
 
+    async def get_id_key(self, service: BaseService, _id: str) -> str:
+        """
+        Get the key of the entry the detail endpoint caches for the id
+        """
+        return await get_cache_key(
+            service, self.name,
+            get_cache_params({self.id_param: _id}, self.defaults)
+        )
+
+    async def get_many(self, service: BaseService, ids) -> dict:
+        """
+        Read the per-id entries of the detail endpoint with one MGET.
+        Returns documents by id, not found and expired entries are skipped
+        """
+        model = self._get_model(service)
+        keys = [await self.get_id_key(service, _id) for _id in ids]
+        try:
+            with REDIS_SECONDS.labels('mget').time():
+                values = await service.redis.mget(keys)
+        except Exception as e:
+            CACHE_ERRORS.labels(self.name, service.INDEX, 'get').inc()
+            logger.warning(f'Failed to read {self.name} from cache: {e}')
+            return {}
+
+        documents = {}
+        for _id, value in zip(ids, values):
+            entry = self._decode(value, model) if value else None
+            if (
+                not entry or entry.not_found
+                or time.time() >= entry.stale_until
+            ):
+                continue
+            documents[_id] = (
+                model.parse_raw(entry.data) if self.raw_response
+                else entry.data
+            )
+
+        prefix = service.INDEX
+        CACHE_HITS.labels(self.name, prefix, 'redis').inc(len(documents))
+        CACHE_MISSES.labels(self.name, prefix).inc(len(ids) - len(documents))
+        return documents
+
+    async def set_many(self, service: BaseService, documents: dict) -> None:
+        """
+        Store documents by id as the per-id entries of the detail endpoint
+        """
+        model = self._get_model(service)
+        async with service.redis.pipeline(transaction=False) as pipe:
+            for _id, document in documents.items():
+                key = await self.get_id_key(service, _id)
+                data = (
+                    self._encode_response(document, model)
+                    if self.raw_response else document
+                )
+                pipe.setex(key, self.ttl, self._encode_entry(data))
+                if settings.CACHE_TAGS_ENABLED:
+                    tag_in_pipeline(
+                        pipe, key, service.get_cache_tags(document), self.ttl
+                    )
+            try:
+                with REDIS_SECONDS.labels('set').time():
+                    await pipe.execute()
+            except Exception as e:
+                CACHE_ERRORS.labels(self.name, service.INDEX, 'set').inc()
+                logger.warning(f'Failed to write {self.name} to cache: {e}')
+
+    def _get_model(self, service: BaseService) -> Type[BaseModel]:
+        return self.model or service.MODEL
+
+    def _encode_response(self, data, model: Type[BaseModel]) -> bytes:
+        """
+        Encode the result the same way FastAPI does for the response model:
+        validate the item fields against the model unless the item is already
+        the model instance and dump them with orjson
+        """
+        def to_dict(item):
+            if type(item) is model:
+                return item.dict()
+            return model.parse_obj(item.dict()).dict()
+
+        if isinstance(data, list):
+            return with_cursor(
+                orjson.dumps([to_dict(item) for item in data]),
+                getattr(data, 'next_cursor', None)
+            )
+        return orjson.dumps(to_dict(data))
+
+    @staticmethod
+    def _unpack(entry: CacheEntry):
+        if entry.not_found:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND, detail=entry.data
+            )
+        return entry.data
+
+    def _to_response(self, data):
+        if self.raw_response:
+            next_cursor = getattr(data, 'next_cursor', None)
+            return Response(
+                content=data,
+                media_type='application/json',
+                headers={NEXT_CURSOR_HEADER: next_cursor}
+                if next_cursor else None
+            )
+        return data
+
+    def _start(self, cache_key: str, load) -> asyncio.Task:
+        task = self._in_flight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(load())
+            self._in_flight[cache_key] = task
+            task.add_done_callback(
+                lambda _: self._in_flight.pop(cache_key, None)
+            )
+        return task
+
+    async def _single_flight(self, cache_key: str, load):
+        """
+        Run only one computation per key in the worker, concurrent misses
+        wait for the same task. The task is shielded so that a cancelled
+        request doesn't cancel it for the others
+        """
+        return await asyncio.shield(self._start(cache_key, load))
+
+    def _revalidate(self, cache_key: str, load) -> None:
+        def log_error(task: asyncio.Task):
+            if not task.cancelled() and task.exception():
+                logger.warning(
+                    f'Background refresh of {cache_key} failed: '
+                    f'{task.exception()}'
+                )
+
+        self._start(cache_key, load).add_done_callback(log_error)
+
+    async def _load(self, service: BaseService, cache_key: str, function,
+                    *args, **kwargs):
+        if not self.lock:
+            return await self._compute(service, cache_key, function,
+                                       *args, **kwargs)
+
+        redis = service.redis
+        lock_key, token = get_lock_key(cache_key), uuid.uuid4().hex
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+
+        while not (locked := await self._acquire_lock(redis, lock_key, token)):
+            if locked is None:
+                # the lock is unavailable, compute without it
+                return await self._compute(service, cache_key, function,
+                                           *args, **kwargs)
+            # another worker is computing the key, wait for its result
+            await asyncio.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+            entry = await self._get_from_cache(redis, cache_key,
+                                               self._get_model(service))
+            if entry and entry.is_fresh():
+                return self._unpack(entry)
+            if time.monotonic() > deadline:
+                return await self._compute(service, cache_key, function,
+                                           *args, **kwargs)
+
+        try:
+            return await self._compute(service, cache_key, function,
+                                       *args, **kwargs)
+        finally:
+            # on failure the lock expires by itself
+            with redis_errors(self.name, lock_key, 'unlock'):
+                await redis.eval(self.RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    async def _acquire_lock(self, redis: Redis, lock_key: str,
+                            token: str) -> bool | None:
+        """
+        Returns None if Redis failed
+        """
+        with redis_errors(self.name, lock_key, 'lock'):
+            return bool(await redis.set(lock_key, token, nx=True,
+                                        ex=settings.CACHE_LOCK_TIMEOUT))
+        return None
+
+    async def _compute(self, service: BaseService, cache_key: str, function,
+                       *args, **kwargs):
+        try:
+            result = await function(*args, **kwargs)
+        except HTTPException as e:
+            if (
+                e.status_code == HTTPStatus.NOT_FOUND
+                and settings.CACHE_NOT_FOUND_EXPIRE
+            ):
+                await self._set_not_found(service, cache_key, e.detail,
+                                          kwargs.get(self.id_param))
+            raise
+
+        if settings.CACHE_TAGS_ENABLED:
+            with redis_errors(self.name, cache_key, 'tag'):
+                await add_tags(service.redis, cache_key,
+                               service.get_cache_tags(result), self.ttl)
+
+        model = self._get_model(service)
+        if self.raw_response:
+            result = self._encode_response(result, model)
+
+        await self._set_to_cache(service.redis, cache_key, result, model)
+        if self.local:
+            local_cache.set(cache_key, result)
+            with redis_errors(self.name, cache_key, 'publish'):
+                await publish_invalidation(service.redis, cache_key)
+        return result
+
     async def _get_from_cache(
-            self, redis: Redis, key: str, model: BaseModel
-    ) -> BaseModel | List[BaseModel] | None:
-        data = await redis.get(key)
-        if not data:
+            self, redis: Redis, key: str, model: Type[BaseModel]
+    ) -> CacheEntry | None:
+        value = None
+        with redis_errors(self.name, key, 'get'):
+            with REDIS_SECONDS.labels('get').time():
+                value = await redis.get(key)
+        if not value:
             return None
-        data = json.loads(data)
 
-        if isinstance(data, list):
-            return [model.parse_raw(item) for item in data]
+        with CACHE_SERIALIZATION_SECONDS.labels(self.name, 'decode').time():
+            return self._decode(value, model)
+
+    def _decode(
+            self, value: bytes, model: Type[BaseModel]
+    ) -> CacheEntry | None:
+        try:
+            entry = codecs.decode(value)
+        except ValueError:
+            return None
+
+        data = entry.data
+        if entry.not_found:
+            return CacheEntry(data, entry.fresh_until, entry.stale_until,
+                              not_found=True)
 
-        return model.parse_obj(data)
+        if not self.raw_response:
+            data = (
+                [model.parse_obj(item) for item in data]
+                if isinstance(data, list) else model.parse_obj(data)
+            )
+        if entry.meta:
+            data = with_cursor(data, entry.meta.get('next_cursor'))
+
+        return CacheEntry(data, entry.fresh_until, entry.stale_until)
 
     async def _set_to_cache(self, redis: Redis, key: str, data, model):
-        if isinstance(data, list):
-            data = [model.json(item) for item in data]
-            return await redis.setex(
-                key, self.CACHE_EXPIRE_IN_SECONDS, json.dumps(data)
+        value = self._encode_entry(data)
+        with redis_errors(self.name, key, 'set'):
+            with REDIS_SECONDS.labels('set').time():
+                await redis.setex(key, self.ttl, value)
+
+    def _encode_entry(self, data) -> bytes:
+        next_cursor = getattr(data, 'next_cursor', None)
+        with CACHE_SERIALIZATION_SECONDS.labels(self.name, 'encode').time():
+            if self.raw_response:
+                codec = codecs.get_codec(codecs.BytesCodec.NAME)
+            else:
+                codec = codecs.get_codec(codecs.OrjsonCodec.NAME)
+                data = (
+                    [item.dict() for item in data] if isinstance(data, list)
+                    else data.dict()
+                )
+
+            now = time.time()
+            value = codecs.encode(
+                data,
+                fresh_until=now + self.expire,
+                stale_until=now + self.expire + self.stale_while_revalidate,
+                codec=codec,
+                meta={'next_cursor': next_cursor} if next_cursor else None
             )
 
-        await redis.setex(key, self.CACHE_EXPIRE_IN_SECONDS, model.json(data))
+        CACHE_PAYLOAD_BYTES.labels(self.name).observe(len(value))
+        return value
+
+    async def _set_not_found(self, service: BaseService, key: str,
+                             detail: str, _id: str | None = None):
+        """
+        Cache the 404 for a short time. The entry is tagged with the
+        requested id, so creating the document can purge it right away
+        """
+        expire = settings.CACHE_NOT_FOUND_EXPIRE
+        fresh_until = time.time() + expire
+        value = codecs.encode(
+            detail, fresh_until=fresh_until, stale_until=fresh_until,
+            codec=codecs.get_codec(codecs.OrjsonCodec.NAME), not_found=True
+        )
+        with redis_errors(self.name, key, 'set'):
+            await service.redis.setex(key, expire, value)
+            if _id and settings.CACHE_TAGS_ENABLED:
+                await add_tags(
+                    service.redis, key, [(service.INDEX, _id)], expire
+                )
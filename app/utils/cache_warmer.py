@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+from aioredis import Redis
+from elasticsearch import AsyncElasticsearch
+from fastapi import HTTPException
+
+from api.v1 import films, genres
+from core.config import settings
+from services.films import FilmService
+from services.genres import GenreService
+
+logger = logging.getLogger(__name__)
+
+WARMER_LOCK_KEY = 'lock:cache:warmer'
+
+
+async def warm_cache(redis: Redis, elastic: AsyncElasticsearch):
+    """
+    Precompute the hottest queries with the same keys the endpoints use:
+    genres list, first pages of films and films of the top genres
+    """
+    film_service = FilmService(redis, elastic)
+    genre_service = GenreService(redis, elastic)
+    sort = settings.CACHE_WARMER_FILMS_SORT
+
+    queries = [genres.genres_list.warm(genre_service=genre_service)]
+    queries.extend(
+        films.films.warm(sort=sort, page=page, film_service=film_service)
+        for page in range(1, settings.CACHE_WARMER_FILMS_PAGES + 1)
+    )
+    top_genres = await film_service.get_top_genres(
+        settings.CACHE_WARMER_TOP_GENRES
+    )
+    queries.extend(
+        films.films.warm(sort=sort, genre=genre_id, film_service=film_service)
+        for genre_id in top_genres
+    )
+
+    for query in queries:
+        try:
+            await query
+        except HTTPException:
+            pass
+
+
+async def run_cache_warmer(redis: Redis, elastic: AsyncElasticsearch):
+    """
+    Warm the cache on startup and then every CACHE_WARMER_INTERVAL seconds.
+    The lock lets only one worker do it per interval
+    """
+    while True:
+        try:
+            if await redis.set(WARMER_LOCK_KEY, 1, nx=True,
+                               ex=settings.CACHE_WARMER_INTERVAL):
+                await warm_cache(redis, elastic)
+        except Exception as e:
+            logger.warning(f'Cache warming failed: {e}')
+        await asyncio.sleep(settings.CACHE_WARMER_INTERVAL)
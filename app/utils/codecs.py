@@ -0,0 +1,139 @@
+import struct
+import zlib
+from typing import Any, NamedTuple
+
+import orjson
+
+from core.config import settings
+
+FORMAT_VERSION = 1
+FLAG_COMPRESSED = 0b1
+FLAG_NOT_FOUND = 0b10
+FLAG_META = 0b100
+
+# format version, codec id, flags, fresh until, stale until
+HEADER = struct.Struct('!BBBdd')
+# length of the optional metadata that follows the header
+META_LENGTH = struct.Struct('!I')
+
+
+class Entry(NamedTuple):
+    data: Any
+    fresh_until: float
+    stale_until: float
+    not_found: bool = False
+    meta: dict | None = None
+
+
+class Codec:
+    ID: int = None
+    NAME: str = None
+
+    def dumps(self, data: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class BytesCodec(Codec):
+    """
+    Stores already encoded data, e.g. a response body, as is
+    """
+    ID = 0
+    NAME = 'bytes'
+
+    def dumps(self, data: bytes) -> bytes:
+        return data
+
+    def loads(self, data: bytes) -> bytes:
+        return data
+
+
+class OrjsonCodec(Codec):
+    ID = 1
+    NAME = 'orjson'
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+CODECS = {codec.ID: codec() for codec in (BytesCodec, OrjsonCodec)}
+CODECS_BY_NAME = {codec.NAME: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS_BY_NAME[name]
+    except KeyError:
+        raise ValueError(f'Unknown cache codec: {name}')
+
+
+def encode(data: Any, fresh_until: float, stale_until: float,
+           codec: Codec, not_found: bool = False,
+           meta: dict | None = None) -> bytes:
+    """
+    Encode a cache entry as header + [metadata] + payload. The header keeps
+    the codec id, so entries written with different codecs can live
+    side by side. Metadata is always encoded with orjson
+    """
+    payload, flags = codec.dumps(data), FLAG_NOT_FOUND if not_found else 0
+    if (
+        settings.CACHE_COMPRESSION
+        and len(payload) >= settings.CACHE_COMPRESSION_MIN_SIZE
+    ):
+        payload = zlib.compress(payload, settings.CACHE_COMPRESSION_LEVEL)
+        flags |= FLAG_COMPRESSED
+
+    meta_data = b''
+    if meta:
+        meta_data = orjson.dumps(meta)
+        meta_data = META_LENGTH.pack(len(meta_data)) + meta_data
+        flags |= FLAG_META
+
+    header = HEADER.pack(
+        FORMAT_VERSION, codec.ID, flags, fresh_until, stale_until
+    )
+    return header + meta_data + payload
+
+
+def decode(value: bytes) -> Entry:
+    """
+    Raises ValueError for entries in an unknown format
+    """
+    if len(value) < HEADER.size:
+        raise ValueError('Cache entry is too short')
+
+    version, codec_id, flags, fresh_until, stale_until = HEADER.unpack_from(
+        value
+    )
+    if version != FORMAT_VERSION or codec_id not in CODECS:
+        raise ValueError(f'Unknown cache entry format: {version}/{codec_id}')
+
+    offset, meta = HEADER.size, None
+    if flags & FLAG_META:
+        try:
+            (length,) = META_LENGTH.unpack_from(value, offset)
+        except struct.error as e:
+            raise ValueError(f'Corrupted cache entry: {e}')
+        offset += META_LENGTH.size
+        meta = orjson.loads(value[offset:offset + length])
+        offset += length
+
+    payload = value[offset:]
+    if flags & FLAG_COMPRESSED:
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as e:
+            raise ValueError(f'Corrupted cache entry: {e}')
+
+    return Entry(
+        data=CODECS[codec_id].loads(payload),
+        fresh_until=fresh_until,
+        stale_until=stale_until,
+        not_found=bool(flags & FLAG_NOT_FOUND),
+        meta=meta
+    )
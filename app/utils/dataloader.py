@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class DataLoader:
+    """
+    Collects load() calls made in the same event loop tick, or within
+    max_delay seconds, and resolves all of them with one batch_load call.
+    batch_load gets a list of unique keys and returns values by key,
+    keys missing from the result resolve to None
+    """
+
+    def __init__(
+            self,
+            batch_load: Callable[[list], Awaitable[dict]],
+            max_delay: float = 0,
+            max_batch_size: int = 100
+    ):
+        self.batch_load = batch_load
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        self._queue: dict[Hashable, list[asyncio.Future]] = {}
+        self._dispatch_task: asyncio.Task | None = None
+        # running tasks are referenced so they aren't garbage collected
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.setdefault(key, []).append(future)
+
+        if len(self._queue) >= self.max_batch_size:
+            self._spawn(self._resolve(self._take_queue()))
+        elif self._dispatch_task is None:
+            self._dispatch_task = self._spawn(self._dispatch_later())
+
+        return await future
+
+    def _take_queue(self) -> dict:
+        queue, self._queue = self._queue, {}
+        if self._dispatch_task is not None:
+            self._dispatch_task.cancel()
+            self._dispatch_task = None
+        return queue
+
+    async def _dispatch_later(self):
+        await asyncio.sleep(self.max_delay)
+        self._dispatch_task = None
+        queue, self._queue = self._queue, {}
+        await self._resolve(queue)
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _resolve(self, queue: dict):
+        if not queue:
+            return
+        try:
+            results = await self.batch_load(list(queue))
+        except Exception as e:
+            for futures in queue.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key, futures in queue.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results.get(key))
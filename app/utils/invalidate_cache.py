@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+import aioredis
+
+base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(base)
+from core.config import settings
+from utils.cache import bump_generation, purge
+
+logger = logging.getLogger(__name__)
+
+
+async def invalidate(index, ids=None):
+    """
+    Delete cache entries that contain the documents with ids,
+    or all cache entries of the index if no ids are given
+    """
+    redis = aioredis.from_url(str(settings.REDIS_URL))
+    try:
+        if ids:
+            deleted = await purge(redis, index, ids)
+            logger.info(f'Deleted {deleted} cache entries of {index} {ids}')
+        else:
+            generation = await bump_generation(redis, index)
+            logger.info(f'Cache of {index} moved to generation {generation}')
+    finally:
+        await redis.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Invalidate cache entries of the index'
+    )
+    parser.add_argument('index', choices=['movies', 'persons', 'genres'])
+    parser.add_argument('--id', dest='ids', action='append',
+                        help='document id, can be repeated')
+    args = parser.parse_args()
+    asyncio.run(invalidate(args.index, args.ids))
@@ -0,0 +1,111 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+from aioredis import Redis
+
+from core.config import settings
+from utils.pubsub import HEARTBEAT_INTERVAL, subscribe
+
+WORKER_ID = uuid.uuid4().hex
+INVALIDATE_ALL = '*'
+KEY_SEPARATOR = '\n'
+GENERATION_PREFIX = 'generation:'
+
+
+class LocalCache:
+    """
+    In-process LRU cache with TTL, kept in front of Redis in every worker
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str) -> Any | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+local_cache = LocalCache(
+    max_size=settings.LOCAL_CACHE_MAX_SIZE, ttl=settings.LOCAL_CACHE_TTL
+)
+
+# cache key generations of the indexes, kept up to date by the listener
+generations: dict[str, int] = {}
+
+
+async def publish_invalidation(redis: Redis, *keys: str):
+    """
+    Tell every worker to drop its local copies of the keys, of all keys by
+    default, with one message. The message is prefixed with the worker id
+    so the sender can skip it
+    """
+    keys = KEY_SEPARATOR.join(keys or [INVALIDATE_ALL])
+    await redis.publish(
+        settings.CACHE_INVALIDATION_CHANNEL, f'{WORKER_ID}:{keys}'
+    )
+
+
+def handle_invalidation(message: bytes | str) -> None:
+    if isinstance(message, bytes):
+        message = message.decode()
+
+    worker_id, _, keys = message.partition(':')
+    if worker_id == WORKER_ID:
+        return
+
+    for key in keys.split(KEY_SEPARATOR):
+        if key == INVALIDATE_ALL:
+            clear_local_state()
+        elif key.startswith(GENERATION_PREFIX):
+            generations.pop(key.removeprefix(GENERATION_PREFIX), None)
+        else:
+            local_cache.delete(key)
+
+
+def clear_local_state() -> None:
+    local_cache.clear()
+    generations.clear()
+
+
+async def listen_for_invalidation(
+        redis: Redis, reconnect_delay: float = 1,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL
+):
+    """
+    Keep the local cache and generations consistent with the other workers.
+    Any messages missed while unsubscribed are unknown, so the whole
+    local state is dropped on every subscription
+    """
+    await subscribe(
+        redis, settings.CACHE_INVALIDATION_CHANNEL, handle_invalidation,
+        on_subscribe=clear_local_state, reconnect_delay=reconnect_delay,
+        heartbeat_interval=heartbeat_interval
+    )
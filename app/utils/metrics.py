@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+
+from aioredis import BlockingConnectionPool
+from elasticsearch import AsyncElasticsearch
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CACHE_HITS = Counter(
+    'cache_hits_total', 'Cache hits',
+    ['route', 'prefix', 'tier']
+)
+CACHE_MISSES = Counter(
+    'cache_misses_total', 'Cache misses',
+    ['route', 'prefix']
+)
+CACHE_ERRORS = Counter(
+    'cache_errors_total', 'Failed cache reads and writes',
+    ['route', 'prefix', 'operation']
+)
+CACHE_SERIALIZATION_SECONDS = Histogram(
+    'cache_serialization_seconds', 'Encoding and decoding of cache entries',
+    ['route', 'operation'], buckets=LATENCY_BUCKETS
+)
+CACHE_PAYLOAD_BYTES = Histogram(
+    'cache_payload_bytes', 'Size of cache entries',
+    ['route'], buckets=SIZE_BUCKETS
+)
+REDIS_SECONDS = Histogram(
+    'redis_operation_seconds', 'Redis command latency',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+ES_SECONDS = Histogram(
+    'elasticsearch_query_seconds', 'Elasticsearch query latency',
+    ['index', 'operation'], buckets=LATENCY_BUCKETS
+)
+
+# summed over the live workers, to compare with the limits of the servers
+POOL_CONNECTIONS = Gauge(
+    'connection_pool_connections', 'Open connections of the client pools',
+    ['client', 'state'], multiprocess_mode='livesum'
+)
+POOL_MAX_CONNECTIONS = Gauge(
+    'connection_pool_max_connections', 'Size limit of the client pools',
+    ['client'], multiprocess_mode='livesum'
+)
+
+
+def sample_redis_pool(pool: BlockingConnectionPool) -> None:
+    # the queue holds idle connections and None for not yet created ones
+    idle = sum(1 for connection in pool.pool._queue if connection is not None)
+    POOL_CONNECTIONS.labels('redis', 'in_use').set(
+        len(pool._connections) - idle
+    )
+    POOL_CONNECTIONS.labels('redis', 'idle').set(idle)
+    POOL_MAX_CONNECTIONS.labels('redis').set(pool.max_connections)
+
+
+def sample_elastic_pool(es: AsyncElasticsearch) -> None:
+    in_use = idle = limit = 0
+    for connection in es.transport.connection_pool.connections:
+        # aiohttp session is created on the first request
+        session = getattr(connection, 'session', None)
+        if session is None:
+            continue
+        connector = session.connector
+        in_use += len(connector._acquired)
+        idle += sum(len(conns) for conns in connector._conns.values())
+        limit += connector.limit
+    POOL_CONNECTIONS.labels('elasticsearch', 'in_use').set(in_use)
+    POOL_CONNECTIONS.labels('elasticsearch', 'idle').set(idle)
+    POOL_MAX_CONNECTIONS.labels('elasticsearch').set(limit)
+
+
+async def run_pool_metrics(pool: BlockingConnectionPool,
+                           es: AsyncElasticsearch, interval: float):
+    """
+    Sample usage of the Redis and Elasticsearch pools of the worker
+    """
+    while True:
+        try:
+            sample_redis_pool(pool)
+            sample_elastic_pool(es)
+        except Exception as e:
+            logger.warning(f'Sampling of connection pools failed: {e}')
+        await asyncio.sleep(interval)
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Metrics of all gunicorn workers are merged if PROMETHEUS_MULTIPROC_DIR
+    is set, otherwise only the current worker metrics are exported
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
@@ -0,0 +1,64 @@
+import base64
+
+import orjson
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class Page(list):
+    """
+    List of documents with the cursor of the next page
+    """
+
+    def __init__(self, items=(), next_cursor: str | None = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+class PageBody(bytes):
+    """
+    Encoded response body of a page with the cursor of the next page
+    """
+    next_cursor: str | None = None
+
+
+def with_cursor(data, next_cursor: str | None):
+    if next_cursor is None:
+        return data
+    if isinstance(data, bytes):
+        data = PageBody(data)
+        data.next_cursor = next_cursor
+        return data
+    return Page(data, next_cursor)
+
+
+def encode_cursor(sort_values: list, sort: list[str]) -> str:
+    """
+    The cursor keeps the sort it was made for, it is only valid for it
+    """
+    return base64.urlsafe_b64encode(
+        orjson.dumps({'sort': sort, 'after': sort_values})
+    ).decode()
+
+
+def decode_cursor(cursor: str, sort: list[str]) -> list:
+    """
+    Sort values of the cursor made for the sort.
+    Raises ValueError for a malformed cursor or one of another sort
+    """
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if not isinstance(data, dict) or data.get('sort') != sort:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+    sort_values = data.get('after')
+    if (
+        not isinstance(sort_values, list)
+        or len(sort_values) != len(sort)
+        or any(isinstance(value, (list, dict)) for value in sort_values)
+    ):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return sort_values
+
@@ -11,7 +11,8 @@ from api.v1.schemas.admin_api import (
     role_schema, role_schema_with_users, base_admin_profile_schema
 )
 from api.v1.user_api import registry, DEFAULT_PAGE_SIZE
-from databases import db
+from databases import db, cache
+from utils.access_events import publish_roles_changed
 
 admin_blueprint = Blueprint('admin', __name__, url_prefix='/admin')
 URL_ADMIN_PREFIX = '/admin'
@@ -94,6 +95,7 @@ def admin_edit_role(role_id):
     data = role_schema.load(request.get_json())
     role.update(data, synchronize_session=False)
     db.session.commit()
+    publish_roles_changed(cache)
 
     return jsonify({"msg": f"Role was updated"}), HTTPStatus.OK
 
@@ -112,6 +114,7 @@ def admin_delete_role(role_id):
 
     db.session.delete(role)
     db.session.commit()
+    publish_roles_changed(cache)
 
     return jsonify({"msg": f"Role {role_id} was deleted"}), HTTPStatus.OK
 
@@ -154,11 +157,15 @@ def admin_edit_profile(user_id):
         raise errors.NotFound(f'User not found')
 
     data = put_admin_profile_schema.load(request.get_json())
-    if 'roles' in data:
-        user_item.update_user_roles(data.pop('roles'))
+    roles = data.pop('roles', None)
+    if roles is not None:
+        user_item.update_user_roles(roles)
 
     user.update(data, synchronize_session=False)
     db.session.commit()
+    # only after the commit, or the old roles could be cached again
+    if roles is not None:
+        publish_roles_changed(cache, user_id)
 
     return jsonify({"msg": f"User profile was updated"}), HTTPStatus.OK
 
@@ -177,6 +184,7 @@ def admin_delete_profile(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    publish_roles_changed(cache, user_id)
 
     return jsonify({"msg": f"User {user_id} was deleted"}), HTTPStatus.OK
 
@@ -1,3 +1,5 @@
+import time
+
 from flask import jsonify
 from flask_jwt_extended import (
     create_access_token, create_refresh_token, set_refresh_cookies, get_jti
@@ -7,6 +9,10 @@ from databases import (
     cache, ACCESS_TOKEN_EXPIRE, REFRESH_TOKEN_EXPIRE
 )
 from extensions import jwt
+from utils.revocation import (
+    BLOCKLIST_COMPLETE_KEY, BLOCKLIST_KEY, REVOCATION_CHANNEL,
+    encode_revocation
+)
 
 
 def get_info_from_refresh_jwt(refresh_jwt):
@@ -54,9 +60,23 @@ def get_cache_keys(refresh_jwt):
 
 
 def add_tokens_to_blocklist(refresh_jwt: dict):
+    """
+    Revoked access tokens are also pushed to the services that keep
+    a local copy of the blocklist
+    """
     refresh_key, access_key = get_cache_keys(refresh_jwt)
-    cache.setex(refresh_key, REFRESH_TOKEN_EXPIRE, 'True')
-    cache.setex(access_key, ACCESS_TOKEN_EXPIRE, 'True')
+    now = time.time()
+    expires_at = now + ACCESS_TOKEN_EXPIRE
+
+    pipe = cache.pipeline()
+    pipe.setex(refresh_key, REFRESH_TOKEN_EXPIRE, 'True')
+    pipe.setex(access_key, ACCESS_TOKEN_EXPIRE, 'True')
+    pipe.zadd(BLOCKLIST_KEY, {access_key: expires_at})
+    # access tokens blocklisted before the first write have expired by then
+    pipe.set(BLOCKLIST_COMPLETE_KEY, expires_at, nx=True)
+    pipe.zremrangebyscore(BLOCKLIST_KEY, '-inf', now)
+    pipe.publish(REVOCATION_CHANNEL, encode_revocation(access_key, expires_at))
+    pipe.execute()
 
 
 def get_blocklist_key(jti: str, user_id: str) -> str:
@@ -1,6 +1,11 @@
 import redis
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine, AsyncSession, create_async_engine
+)
+from sqlalchemy.orm import sessionmaker
 
 from core.settings import settings
 
@@ -8,6 +13,28 @@ db = SQLAlchemy()
 cache = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
 
 
+def create_async_cache() -> aioredis.Redis:
+    return aioredis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+
+def create_async_db() -> tuple[AsyncEngine, sessionmaker]:
+    """
+    Engine and session factory for the asyncio server,
+    the models are shared with the Flask app
+    """
+    engine = create_async_engine(
+        settings.POSTGRES_URL.replace(
+            'postgresql://', 'postgresql+asyncpg://', 1
+        ),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT
+    )
+    return engine, sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+
 def configure_db(app: Flask):
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SQLALCHEMY_DATABASE_URI'] = settings.POSTGRES_URL
@@ -1,60 +1,254 @@
+import asyncio
+import logging
+import uuid
 from concurrent import futures
 
 import grpc
+from sqlalchemy import select
 
 from utils.grpc import auth_pb2 as pb2, auth_pb2_grpc as pb2_grpc
 from app.app import app
-from app.databases import db, cache
-from app.models import User
+from app.databases import db, cache, create_async_cache, create_async_db
+from app.models import Role, UserRole
 from core.settings import settings
-from utils.access_validation import is_token_valid, is_allowed
+from utils.access_validation import (
+    async_is_token_valid, is_token_valid, is_allowed
+)
+from utils.revocation import listen_for_revocations, start_revocation_listener
 
+logger = logging.getLogger(__name__)
 
-class AuthService(pb2_grpc.AuthServicer):
 
-    def __init__(self, *args, **kwargs):
-        pass
+def get_users_roles_query(user_ids):
+    return select(
+        UserRole.user, Role.name
+    ).join(
+        Role, Role.id == UserRole.role
+    ).where(
+        UserRole.user.in_([uuid.UUID(user_id) for user_id in user_ids])
+    )
 
-    def HasAccess(self, request, context):
-        token, roles = request.token, request.roles
-        if not token:
-            result = {'message': 'No access token', 'has_access': False}
-            return pb2.HasAccessResponse(**result)
 
-        secret_key = settings.JWT_SECRET_KEY
-        status, response = is_token_valid(token, secret_key, cache)
+def group_roles(rows) -> dict[str, list[str]]:
+    users_roles = {}
+    for user_id, role in rows:
+        users_roles.setdefault(str(user_id), []).append(role)
+    return users_roles
 
-        if not status:
-            result = {'message': response, 'has_access': status}
-            return pb2.HasAccessResponse(**result)
 
-        if not roles:
-            result = {'message': 'success', 'has_access': status}
-            return pb2.HasAccessResponse(**result)
+def get_response(message, has_access, request_id=''):
+    return pb2.HasAccessResponse(
+        message=message, has_access=has_access, id=request_id
+    )
 
-        user_id = response['sub']['user_id']
-        with app.app_context():
-            user = db.session.query(User).filter(User.id == user_id).first()
-            user_roles = [role.name for role in user.get_user_roles()]
 
-        if is_allowed(user_roles, or_=None, and_=roles, roles=None):
-            result = {'message': 'success', 'has_access': status}
-            return pb2.HasAccessResponse(**result)
+def get_token_response(request, status, response):
+    """
+    Response to the request once its token is checked,
+    None if roles of the user are needed
+    """
+    if not status:
+        return get_response(response, False, request.id)
+    if not request.roles:
+        return get_response('success', True, request.id)
+    return None
+
+
+def get_roles_response(request, user_roles):
+    if is_allowed(
+        user_roles, or_=None, and_=list(request.roles), roles=None
+    ):
+        return get_response('success', True, request.id)
+    return get_response(
+        'Not enough permissions to access', False, request.id
+    )
+
+
+class AuthService(pb2_grpc.AuthServicer):
+    """
+    Servicer of the thread pool server
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def HasAccess(self, request, context):
+        return self.check_access([request])[0]
+
+    def BatchHasAccess(self, request, context):
+        return pb2.BatchHasAccessResponse(
+            responses=self.check_access(request.messages)
+        )
+
+    def HasAccessStream(self, request_iterator, context):
+        for request in request_iterator:
+            yield self.check_access([request])[0]
+
+    @staticmethod
+    def check_access(requests) -> list:
+        """
+        Check the tokens, roles of all the users are fetched at once
+        """
+        responses, users = [], {}
+        for index, request in enumerate(requests):
+            if not request.token:
+                responses.append(
+                    get_response('No access token', False, request.id)
+                )
+                continue
+
+            status, response = is_token_valid(
+                request.token, settings.JWT_SECRET_KEY, cache
+            )
+            responses.append(get_token_response(request, status, response))
+            if responses[-1] is None:
+                users[index] = response['sub']['user_id']
+
+        if not users:
+            return responses
 
-        result = {
-            'message': 'Not enough permissions to access',
-            'has_access': False
-        }
-        return pb2.HasAccessResponse(**result)
+        with app.app_context():
+            users_roles = group_roles(db.session.execute(
+                get_users_roles_query(set(users.values()))
+            ).all())
+
+        for index, user_id in users.items():
+            responses[index] = get_roles_response(
+                requests[index], users_roles.get(user_id, [])
+            )
+        return responses
+
+
+class AsyncAuthService(pb2_grpc.AuthServicer):
+    """
+    Servicer of the asyncio server. Calls wait for the database and Redis
+    without blocking each other, the number of concurrent queries is
+    limited by the pool of the engine
+    """
+
+    def __init__(self, redis, session_factory):
+        self.redis = redis
+        self.session_factory = session_factory
+
+    async def HasAccess(self, request, context):
+        return (await self.check_access([request]))[0]
+
+    async def BatchHasAccess(self, request, context):
+        return pb2.BatchHasAccessResponse(
+            responses=await self.check_access(request.messages)
+        )
+
+    async def HasAccessStream(self, request_iterator, context):
+        """
+        Messages of the stream are checked concurrently, up to
+        GRPC_STREAM_MAX_CONCURRENCY at a time, further messages aren't read
+        until a check is done. Responses are sent as soon as they are ready,
+        a failed check is answered with no access
+        """
+        semaphore = asyncio.Semaphore(settings.GRPC_STREAM_MAX_CONCURRENCY)
+        write_lock, tasks, errors = asyncio.Lock(), set(), []
+
+        async def check(request):
+            try:
+                try:
+                    response = (await self.check_access([request]))[0]
+                except Exception as e:
+                    logger.exception(f'Access check failed: {e}')
+                    response = get_response(
+                        'Access check failed', False, request.id
+                    )
+                async with write_lock:
+                    await context.write(response)
+            finally:
+                semaphore.release()
+
+        def done(task):
+            tasks.discard(task)
+            if not task.cancelled() and task.exception():
+                errors.append(task.exception())
+
+        async for request in request_iterator:
+            await semaphore.acquire()
+            if errors:
+                semaphore.release()
+                break
+            task = asyncio.create_task(check(request))
+            tasks.add(task)
+            task.add_done_callback(done)
+
+        if tasks:
+            await asyncio.wait(tasks)
+        # responses can't be sent, the stream is aborted
+        if errors:
+            raise errors[0]
+
+    async def check_access(self, requests) -> list:
+        responses, users = [], {}
+        for index, request in enumerate(requests):
+            if not request.token:
+                responses.append(
+                    get_response('No access token', False, request.id)
+                )
+                continue
+
+            status, response = await async_is_token_valid(
+                request.token, settings.JWT_SECRET_KEY, self.redis
+            )
+            responses.append(get_token_response(request, status, response))
+            if responses[-1] is None:
+                users[index] = response['sub']['user_id']
+
+        if not users:
+            return responses
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                get_users_roles_query(set(users.values()))
+            )
+            users_roles = group_roles(result.all())
+
+        for index, user_id in users.items():
+            responses[index] = get_roles_response(
+                requests[index], users_roles.get(user_id, [])
+            )
+        return responses
 
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    start_revocation_listener(cache)
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=settings.GRPC_MAX_WORKERS),
+        maximum_concurrent_rpcs=settings.GRPC_MAX_CONCURRENT_RPCS
+    )
     pb2_grpc.add_AuthServicer_to_server(AuthService(), server)
     server.add_insecure_port(f'[::]:{settings.GRPC_PORT}')
     server.start()
     server.wait_for_termination()
 
 
+async def serve_aio():
+    redis = create_async_cache()
+    engine, session_factory = create_async_db()
+    listener = asyncio.create_task(listen_for_revocations(redis))
+
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=settings.GRPC_MAX_CONCURRENT_RPCS
+    )
+    pb2_grpc.add_AuthServicer_to_server(
+        AsyncAuthService(redis, session_factory), server
+    )
+    server.add_insecure_port(f'[::]:{settings.GRPC_PORT}')
+    await server.start()
+    try:
+        await server.wait_for_termination()
+    finally:
+        listener.cancel()
+        await engine.dispose()
+        await redis.close()
+
+
 if __name__ == '__main__':
-    serve()
+    if settings.GRPC_SERVER_MODE == 'aio':
+        asyncio.run(serve_aio())
+    else:
+        serve()
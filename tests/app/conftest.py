@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+ROOT = Path(__file__).resolve().parents[2]
+
+os.environ.setdefault('JWT_SECRET_KEY', 'test')
+sys.path.insert(0, str(ROOT / 'app'))
+
+import utils  # noqa: E402
+
+# the shared utils are merged into the utils of the app in its image
+utils.__path__.append(str(ROOT / 'utils'))
+
+
+@pytest.fixture
+def redis():
+    # every test gets an empty server of its own
+    return FakeRedis()
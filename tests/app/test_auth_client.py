@@ -0,0 +1,135 @@
+import asyncio
+from http import HTTPStatus
+
+import grpc
+import pytest
+from fastapi import HTTPException
+
+import utils.grpc.auth_pb2 as pb2
+import utils.grpc.auth_pb2_grpc as pb2_grpc
+from api.v1.utils import authentication
+from api.v1.utils.authentication import AuthClient, get_access
+from core.config import settings
+
+
+class Servicer(pb2_grpc.AuthServicer):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    async def HasAccess(self, request, context):
+        self.calls.append(('HasAccess', context.peer()))
+        await asyncio.sleep(self.delay)
+        return pb2.HasAccessResponse(
+            has_access=request.token == 'valid', message='success'
+        )
+
+    async def BatchHasAccess(self, request, context):
+        self.calls.append(('BatchHasAccess', len(request.messages)))
+        return pb2.BatchHasAccessResponse(responses=[
+            pb2.HasAccessResponse(
+                has_access=(
+                    message.token == 'valid' and 'admin' in message.roles
+                ),
+                message='success'
+            )
+            for message in request.messages
+        ])
+
+
+async def start_server(servicer):
+    server = grpc.aio.server()
+    pb2_grpc.add_AuthServicer_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    await server.start()
+    return server, port
+
+
+def run_with_client(servicer, check, **kwargs):
+    async def run():
+        server, port = await start_server(servicer)
+        client = AuthClient(host='127.0.0.1', port=port, **kwargs)
+        try:
+            await client.connect()
+            return await check(client)
+        finally:
+            await client.close()
+            await server.stop(None)
+
+    return asyncio.run(run())
+
+
+def test_calls_are_spread_over_the_pool():
+    servicer = Servicer()
+
+    async def check(client):
+        return await asyncio.gather(*(
+            client.get_auth_response(token=token, roles=['admin'])
+            for token in ('valid', 'invalid', 'valid', 'valid')
+        ))
+
+    responses = run_with_client(servicer, check, pool_size=2, batch=False)
+
+    assert [r.has_access for r in responses] == [True, False, True, True]
+    # every channel of the pool has a connection of its own
+    assert len({peer for _, peer in servicer.calls}) == 2
+
+
+def test_concurrent_checks_share_one_batch_call():
+    servicer = Servicer()
+    checks = [('valid', ['admin']), ('invalid', ['admin']),
+              ('valid', ['editor']), ('valid', ['admin'])]
+
+    async def check(client):
+        return await asyncio.gather(*(
+            client.get_auth_response(token=token, roles=roles)
+            for token, roles in checks
+        ))
+
+    responses = run_with_client(servicer, check)
+
+    assert [r.has_access for r in responses] == [True, False, False, True]
+    # the repeated check is sent once
+    assert servicer.calls == [('BatchHasAccess', 3)]
+
+
+def test_deadline_is_exceeded():
+    async def check(client):
+        with pytest.raises(grpc.aio.AioRpcError) as error:
+            await client.get_auth_response(token='valid', roles=[])
+        return error.value.code()
+
+    code = run_with_client(
+        Servicer(delay=0.5), check, timeout=0.1, batch=False
+    )
+
+    assert code == grpc.StatusCode.DEADLINE_EXCEEDED
+
+
+def test_get_access_answers_503_when_the_server_fails(monkeypatch):
+    monkeypatch.setattr(settings, 'ACCESS_CACHE_ENABLED', False)
+
+    async def check(client):
+        monkeypatch.setattr(authentication, 'grpc_client', client)
+        allowed = await get_access('valid', ['admin'])
+        with pytest.raises(HTTPException) as error:
+            client.timeout = 0.05
+            await get_access('valid', ['admin'])
+        return allowed, error.value.status_code
+
+    allowed, status_code = run_with_client(
+        Servicer(delay=0.2), check, timeout=1, batch=False
+    )
+
+    assert allowed == (True, 'success')
+    assert status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+def test_connect_to_a_server_that_is_down():
+    async def run():
+        # nothing listens on the discard port
+        client = AuthClient(host='127.0.0.1', port=9, timeout=0.1)
+        await client.connect()
+        await client.close()
+
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+from utils.bloom import BloomFilter, bloom_filters, might_exist
+
+INDEX = 'movies'
+
+
+def test_no_false_negatives():
+    bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+    ids = [f'id-{i}' for i in range(1000)]
+    for _id in ids:
+        bloom_filter.add(_id)
+    assert all(_id in bloom_filter for _id in ids)
+
+
+def test_false_positive_rate():
+    bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom_filter.add(f'id-{i}')
+    false_positives = sum(
+        f'other-{i}' in bloom_filter for i in range(10000)
+    )
+    # well within the error rate, the filter is deterministic
+    assert false_positives < 300
+
+
+def test_empty_filter():
+    bloom_filter = BloomFilter(capacity=0, error_rate=0.01)
+    assert 'id' not in bloom_filter
+    bloom_filter.add('id')
+    assert 'id' in bloom_filter
+
+
+def test_might_exist():
+    bloom_filters.pop(INDEX, None)
+    assert might_exist(INDEX, 'id')
+
+    bloom_filter = BloomFilter(capacity=10, error_rate=0.01)
+    bloom_filter.add('id')
+    bloom_filters[INDEX] = bloom_filter
+    try:
+        assert might_exist(INDEX, 'id')
+        assert not might_exist(INDEX, 'unknown')
+    finally:
+        del bloom_filters[INDEX]
@@ -0,0 +1,384 @@
+import asyncio
+
+import orjson
+import pytest
+from elasticsearch import ElasticsearchException
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+from core.config import settings
+from services.base import BaseService
+from utils.bloom import BloomFilter, bloom_filters
+from utils.local_cache import GENERATION_PREFIX, generations, local_cache
+from utils.cache import (
+    KEY_VERSION, bump_generation, cache, get_cache_key, get_cache_params,
+    get_generation_key, get_lock_key, purge
+)
+from utils.pagination import NEXT_CURSOR_HEADER, Page
+
+
+class Item(BaseModel):
+    id: str
+    title: str
+
+
+class Service(BaseService):
+    INDEX = 'items'
+    MODEL = Item
+
+
+class Backend:
+    """
+    Stands in for Elasticsearch behind the cached endpoint, titles of the
+    items tell the calls apart
+    """
+
+    def __init__(self, delay: float = 0):
+        self.calls = []
+        self.delay = delay
+        self.error = None
+
+    async def get(self, item_id: str) -> Item:
+        self.calls.append(item_id)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        if item_id == 'missing':
+            raise HTTPException(status_code=404, detail='Item not found')
+        return Item(id=item_id, title=f'call {len(self.calls)}')
+
+
+def get_endpoint(backend: Backend, **kwargs):
+    kwargs.setdefault('local', False)
+    kwargs.setdefault('lock', False)
+
+    @cache(**kwargs)
+    async def get_item(item_id: str, item_service: Service = None):
+        return await backend.get(item_id)
+
+    return get_item
+
+
+@pytest.fixture(autouse=True)
+def clear_local_state():
+    yield
+    local_cache.clear()
+    generations.clear()
+
+
+@pytest.fixture
+def service(redis):
+    return Service(redis, None)
+
+
+def test_redis_hit(service):
+    backend = Backend()
+    get_item = get_endpoint(backend)
+
+    async def run():
+        return [
+            await get_item(item_id='a', item_service=service)
+            for _ in range(2)
+        ]
+
+    first, second = asyncio.run(run())
+    assert backend.calls == ['a']
+    assert second == first
+
+
+def test_local_tier(service):
+    backend = Backend()
+    get_item = get_endpoint(backend, local=True)
+
+    async def run():
+        first = await get_item(item_id='a', item_service=service)
+        # the worker answers from memory without Redis
+        await service.redis.flushall()
+        return first, await get_item(item_id='a', item_service=service)
+
+    first, second = asyncio.run(run())
+    assert backend.calls == ['a']
+    assert second is first
+
+
+def test_single_flight(service):
+    backend = Backend(delay=0.01)
+    get_item = get_endpoint(backend)
+
+    async def run():
+        return await asyncio.gather(
+            *(get_item(item_id='a', item_service=service) for _ in range(5))
+        )
+
+    results = asyncio.run(run())
+    assert backend.calls == ['a']
+    assert all(result == results[0] for result in results)
+
+
+def test_cancelled_request_keeps_computation(service):
+    backend = Backend(delay=0.05)
+    get_item = get_endpoint(backend)
+
+    async def run():
+        first = asyncio.create_task(
+            get_item(item_id='a', item_service=service)
+        )
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(
+            get_item(item_id='a', item_service=service)
+        )
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()).title == 'call 1'
+    assert backend.calls == ['a']
+
+
+def test_lock_waits_for_other_worker(monkeypatch, service):
+    monkeypatch.setattr(settings, 'CACHE_LOCK_POLL_INTERVAL', 0.01)
+    backend = Backend()
+    get_item = get_endpoint(backend, lock=True)
+
+    async def run():
+        key = await get_cache_key(service, 'get_item', {'item_id': 'a'})
+        await service.redis.set(get_lock_key(key), 'other worker')
+
+        task = asyncio.create_task(get_item(item_id='a', item_service=service))
+        await asyncio.sleep(0.05)
+        assert not task.done()
+
+        await get_item.cache._set_to_cache(
+            service.redis, key, Item(id='a', title='other worker'), Item
+        )
+        return await task
+
+    assert asyncio.run(run()).title == 'other worker'
+    assert backend.calls == []
+
+
+def test_lock_is_released(service):
+    get_item = get_endpoint(Backend(), lock=True)
+
+    async def run():
+        await get_item(item_id='a', item_service=service)
+        key = await get_cache_key(service, 'get_item', {'item_id': 'a'})
+        return await service.redis.exists(get_lock_key(key))
+
+    assert asyncio.run(run()) == 0
+
+
+def test_stale_while_revalidate(service):
+    backend = Backend()
+    get_item = get_endpoint(
+        backend, expire=0, stale_while_revalidate=60, stale_if_error=0
+    )
+
+    async def run():
+        first = await get_item(item_id='a', item_service=service)
+        stale = await get_item(item_id='a', item_service=service)
+        # the entry is refreshed in the background
+        await asyncio.sleep(0.01)
+        refreshed = await get_item(item_id='a', item_service=service)
+        return first, stale, refreshed
+
+    first, stale, refreshed = asyncio.run(run())
+    assert stale == first
+    assert refreshed.title == 'call 2'
+
+
+def test_stale_if_error(service):
+    backend = Backend()
+    get_item = get_endpoint(
+        backend, expire=0, stale_while_revalidate=0, stale_if_error=60
+    )
+
+    async def run():
+        first = await get_item(item_id='a', item_service=service)
+        backend.error = ElasticsearchException('unavailable')
+        return first, await get_item(item_id='a', item_service=service)
+
+    first, second = asyncio.run(run())
+    assert second == first
+    assert backend.calls == ['a', 'a']
+
+
+def test_error_without_entry(service):
+    backend = Backend()
+    backend.error = ElasticsearchException('unavailable')
+    get_item = get_endpoint(backend)
+
+    with pytest.raises(ElasticsearchException):
+        asyncio.run(get_item(item_id='a', item_service=service))
+
+
+def test_raw_response(service):
+    backend = Backend()
+    get_item = get_endpoint(backend, raw_response=True)
+
+    async def run():
+        return [
+            await get_item(item_id='a', item_service=service)
+            for _ in range(2)
+        ]
+
+    first, second = asyncio.run(run())
+    assert backend.calls == ['a']
+    assert isinstance(second, Response)
+    assert orjson.loads(second.body) == {'id': 'a', 'title': 'call 1'}
+    assert second.body == first.body
+
+
+def test_raw_page_keeps_cursor(service):
+    calls = []
+
+    @cache(raw_response=True, local=False, lock=False)
+    async def get_items(page_size: int = 2, item_service: Service = None):
+        calls.append(page_size)
+        return Page(
+            [Item(id=str(i), title='item') for i in range(page_size)],
+            next_cursor='next'
+        )
+
+    async def run():
+        return [await get_items(item_service=service) for _ in range(2)]
+
+    first, second = asyncio.run(run())
+    assert calls == [2]
+    assert orjson.loads(bytes(second.body)) == [
+        {'id': '0', 'title': 'item'}, {'id': '1', 'title': 'item'}
+    ]
+    assert first.headers[NEXT_CURSOR_HEADER] == 'next'
+    assert second.headers[NEXT_CURSOR_HEADER] == 'next'
+
+
+def test_canonical_cache_key(service):
+    defaults = {'page': 1, 'sort': None}
+
+    async def get_key(**kwargs):
+        return await get_cache_key(
+            service, 'get_items', get_cache_params(kwargs, defaults)
+        )
+
+    async def run():
+        return (
+            await get_key(genre='g', page=1, sort=None, item_service=service),
+            await get_key(item_service=service, genre='g'),
+            await get_key(genre='g', page=2),
+        )
+
+    key, same_key, other_key = asyncio.run(run())
+    assert key == same_key
+    assert key != other_key
+    assert key.startswith(f'items:v{KEY_VERSION}:g0:get_items:')
+
+
+def test_bump_generation(service):
+    backend = Backend()
+    get_item = get_endpoint(backend)
+    pubsub = service.redis.pubsub()
+
+    async def run():
+        await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+        await pubsub.get_message(timeout=1)
+
+        await get_item(item_id='a', item_service=service)
+        generation = await bump_generation(service.redis, Service.INDEX)
+        message = await pubsub.get_message(timeout=1)
+        refreshed = await get_item(item_id='a', item_service=service)
+        key = await get_cache_key(service, 'get_item', {'item_id': 'a'})
+        return generation, message, refreshed, key
+
+    generation, message, refreshed, key = asyncio.run(run())
+    assert generation == 1
+    assert message['data'].decode().endswith(f':{GENERATION_PREFIX}items')
+    assert refreshed.title == 'call 2'
+    assert ':g1:' in key
+
+
+def test_generation_of_other_worker(service):
+    async def run():
+        await service.redis.set(get_generation_key(Service.INDEX), 5)
+        first = await get_cache_key(service, 'get_item', {})
+        # known generations are kept until the invalidation message
+        await service.redis.set(get_generation_key(Service.INDEX), 6)
+        second = await get_cache_key(service, 'get_item', {})
+        generations.pop(Service.INDEX)
+        return first, second, await get_cache_key(service, 'get_item', {})
+
+    first, second, third = asyncio.run(run())
+    assert ':g5:' in first and first == second
+    assert ':g6:' in third
+
+
+def test_purge_by_tag(service):
+    backend = Backend()
+    get_item = get_endpoint(backend)
+
+    async def run():
+        await get_item(item_id='a', item_service=service)
+        await get_item(item_id='b', item_service=service)
+        deleted = await purge(service.redis, Service.INDEX, ['a'])
+        return deleted, [
+            (await get_item(item_id=_id, item_service=service)).title
+            for _id in ('a', 'b')
+        ]
+
+    deleted, titles = asyncio.run(run())
+    assert deleted == 1
+    assert titles == ['call 3', 'call 2']
+
+
+def test_not_found_is_cached(service):
+    backend = Backend()
+    get_item = get_endpoint(backend)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                await get_item(item_id='missing', item_service=service)
+            assert error.value.status_code == 404
+            assert error.value.detail == 'Item not found'
+        key = await get_cache_key(service, 'get_item', {'item_id': 'missing'})
+        return await service.redis.ttl(key)
+
+    ttl = asyncio.run(run())
+    assert backend.calls == ['missing']
+    assert 0 < ttl <= settings.CACHE_NOT_FOUND_EXPIRE
+
+
+def test_not_found_is_purged_by_id(service):
+    backend = Backend()
+    get_item = get_endpoint(backend, id_param='item_id')
+
+    async def run():
+        with pytest.raises(HTTPException):
+            await get_item(item_id='missing', item_service=service)
+        # the document is created
+        await purge(service.redis, Service.INDEX, ['missing'])
+        with pytest.raises(HTTPException):
+            await get_item(item_id='missing', item_service=service)
+
+    asyncio.run(run())
+    assert backend.calls == ['missing', 'missing']
+
+
+def test_unknown_id_skips_cache(service):
+    backend = Backend()
+    get_item = get_endpoint(backend, id_param='item_id')
+    bloom_filter = BloomFilter(capacity=10, error_rate=0.01)
+    bloom_filter.add('a')
+    bloom_filters[Service.INDEX] = bloom_filter
+
+    async def run():
+        for _ in range(2):
+            await get_item(item_id='a', item_service=service)
+            await get_item(item_id='b', item_service=service)
+        return await service.redis.keys(f'{Service.INDEX}:*')
+
+    try:
+        keys = asyncio.run(run())
+    finally:
+        del bloom_filters[Service.INDEX]
+    assert backend.calls == ['a', 'b', 'b']
+    assert len(keys) == 1
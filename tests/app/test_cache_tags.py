@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from core.config import settings
+from utils.cache import add_tags, get_tag_key, purge
+from utils.local_cache import WORKER_ID
+
+INDEX = 'movies'
+TTL = 60
+
+
+def test_expired_members_are_trimmed(redis):
+    tag_key = get_tag_key(INDEX, 'film')
+
+    async def run():
+        # an entry of an old generation that expired long ago
+        await redis.zadd(tag_key, {'movies:g0:old': time.time() - 1})
+        await add_tags(redis, 'movies:g1:new', [(INDEX, 'film')], TTL)
+        return await redis.zrange(tag_key, 0, -1), await redis.ttl(tag_key)
+
+    members, ttl = asyncio.run(run())
+    assert members == [b'movies:g1:new']
+    assert 0 < ttl <= TTL
+
+
+def test_purge(redis):
+    pubsub = redis.pubsub()
+
+    async def run():
+        await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+        await pubsub.get_message(timeout=1)
+
+        for key, ids in (('search', ['a', 'b']), ('a', ['a']), ('c', ['c'])):
+            await redis.set(key, 'entry')
+            await add_tags(redis, key, [(INDEX, _id) for _id in ids], TTL)
+
+        deleted = await purge(redis, INDEX, ['a', 'b'])
+        message = await pubsub.get_message(timeout=1)
+        extra = await pubsub.get_message(timeout=0.1)
+        keys = [key for key in ('search', 'a', 'c') if await redis.exists(key)]
+        tags = await redis.exists(
+            get_tag_key(INDEX, 'a'), get_tag_key(INDEX, 'b')
+        )
+        return deleted, message, extra, keys, tags
+
+    deleted, message, extra, keys, tags = asyncio.run(run())
+    assert deleted == 2
+    assert keys == ['c']
+    assert tags == 0
+    # one message for all the keys
+    worker_id, _, purged = message['data'].decode().partition(':')
+    assert worker_id == WORKER_ID
+    assert sorted(purged.split('\n')) == ['a', 'search']
+    assert extra is None
+
+
+def test_purge_nothing(redis):
+    async def run():
+        return await purge(redis, INDEX, ['unknown'])
+
+    assert asyncio.run(run()) == 0
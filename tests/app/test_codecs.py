@@ -0,0 +1,60 @@
+import zlib
+
+import pytest
+
+from core.config import settings
+from utils import codecs
+
+DATA = [{'id': str(i), 'title': 'Star Wars', 'imdb_rating': 8.6}
+        for i in range(100)]
+
+
+@pytest.mark.parametrize('compression', [False, True])
+def test_orjson_round_trip(monkeypatch, compression):
+    monkeypatch.setattr(settings, 'CACHE_COMPRESSION', compression)
+    monkeypatch.setattr(settings, 'CACHE_COMPRESSION_MIN_SIZE', 1)
+
+    value = codecs.encode(
+        DATA, fresh_until=1, stale_until=2,
+        codec=codecs.get_codec(codecs.OrjsonCodec.NAME),
+        meta={'next_cursor': 'cursor'}
+    )
+    assert codecs.decode(value) == codecs.Entry(
+        DATA, fresh_until=1, stale_until=2, meta={'next_cursor': 'cursor'}
+    )
+
+
+def test_bytes_round_trip():
+    body = b'{"id": "1"}'
+    value = codecs.encode(
+        body, fresh_until=1, stale_until=2,
+        codec=codecs.get_codec(codecs.BytesCodec.NAME), not_found=True
+    )
+    entry = codecs.decode(value)
+    assert entry.data == body
+    assert entry.not_found
+    assert entry.meta is None
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        codecs.get_codec('pickle')
+
+
+@pytest.mark.parametrize('value', [
+    b'',
+    b'short',
+    codecs.HEADER.pack(codecs.FORMAT_VERSION + 1, 1, 0, 1, 2) + b'{}',
+    codecs.HEADER.pack(codecs.FORMAT_VERSION, 255, 0, 1, 2) + b'{}',
+    codecs.HEADER.pack(codecs.FORMAT_VERSION, 1, 0, 1, 2) + b'{',
+    codecs.HEADER.pack(
+        codecs.FORMAT_VERSION, 1, codecs.FLAG_COMPRESSED, 1, 2
+    ) + b'not zlib',
+    codecs.HEADER.pack(
+        codecs.FORMAT_VERSION, 1, codecs.FLAG_COMPRESSED, 1, 2
+    ) + zlib.compress(b'{"id": "1"}')[:-4],
+    codecs.HEADER.pack(codecs.FORMAT_VERSION, 1, codecs.FLAG_META, 1, 2),
+])
+def test_malformed_entry(value):
+    with pytest.raises(ValueError):
+        codecs.decode(value)
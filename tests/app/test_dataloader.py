@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from utils.dataloader import DataLoader
+
+
+def get_loader(batches: list, max_batch_size: int = 100,
+               error: Exception | None = None) -> DataLoader:
+    async def batch_load(keys):
+        batches.append(keys)
+        if error:
+            raise error
+        return {key: key.upper() for key in keys if key != 'missing'}
+
+    return DataLoader(batch_load, max_batch_size=max_batch_size)
+
+
+def test_batch_within_tick():
+    batches = []
+
+    async def run():
+        loader = get_loader(batches)
+        return await asyncio.gather(
+            loader.load('a'), loader.load('b'), loader.load('a')
+        )
+
+    assert asyncio.run(run()) == ['A', 'B', 'A']
+    assert batches == [['a', 'b']]
+
+
+def test_batches_of_next_ticks():
+    batches = []
+
+    async def run():
+        loader = get_loader(batches)
+        first = await loader.load('a')
+        return first, await loader.load('b')
+
+    assert asyncio.run(run()) == ('A', 'B')
+    assert batches == [['a'], ['b']]
+
+
+def test_max_batch_size():
+    batches = []
+
+    async def run():
+        loader = get_loader(batches, max_batch_size=2)
+        return await asyncio.gather(*(loader.load(key) for key in 'abcde'))
+
+    assert asyncio.run(run()) == ['A', 'B', 'C', 'D', 'E']
+    assert batches == [['a', 'b'], ['c', 'd'], ['e']]
+
+
+def test_missing_key():
+    batches = []
+
+    async def run():
+        loader = get_loader(batches)
+        return await asyncio.gather(loader.load('a'), loader.load('missing'))
+
+    assert asyncio.run(run()) == ['A', None]
+
+
+def test_error_fan_out():
+    batches = []
+
+    async def run():
+        loader = get_loader(batches, error=RuntimeError('down'))
+        return await asyncio.gather(
+            loader.load('a'), loader.load('b'), loader.load('a'),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batches == [['a', 'b']]
+
+
+def test_error_of_one_batch():
+    batches = []
+
+    async def run():
+        loader = get_loader(batches, error=RuntimeError('down'))
+        with pytest.raises(RuntimeError):
+            await loader.load('a')
+        loader.batch_load = get_loader(batches).batch_load
+        return await loader.load('a')
+
+    assert asyncio.run(run()) == 'A'
@@ -0,0 +1,53 @@
+import asyncio
+
+from elasticsearch import NotFoundError
+from pydantic import BaseModel
+
+from services.base import ElasticSearchManager
+
+
+class Item(BaseModel):
+    id: str
+
+
+class Elastic:
+    """
+    Answers mget like Elasticsearch, or as for a missing index
+    """
+
+    def __init__(self, docs: dict[str, dict] | None):
+        self.docs = docs
+        self.calls = []
+
+    async def mget(self, index, body):
+        self.calls.append(body['ids'])
+        if self.docs is None:
+            raise NotFoundError(404, 'index_not_found_exception', {})
+        return {'docs': [
+            {'_id': _id, 'found': True, '_source': self.docs[_id]}
+            if _id in self.docs else {'_id': _id, 'found': False}
+            for _id in body['ids']
+        ]}
+
+
+class Service:
+    INDEX = 'items'
+    MODEL = Item
+
+    def __init__(self, elastic: Elastic):
+        self.elastic = elastic
+
+
+def test_get_by_ids():
+    elastic = Elastic({'1': {'id': '1'}})
+    manager = ElasticSearchManager(Service(elastic))
+
+    result = asyncio.run(manager.get_by_ids(['1', '2']))
+    assert result == {'1': Item(id='1')}
+    assert asyncio.run(manager.get_by_ids([])) == {}
+    assert elastic.calls == [['1', '2']]
+
+
+def test_get_by_ids_missing_index():
+    manager = ElasticSearchManager(Service(Elastic(None)))
+    assert asyncio.run(manager.get_by_ids(['1'])) == {}
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from api.v1.utils.export import ndjson_response
+from core.config import settings
+from services.base import BaseService
+
+ITEMS = [{'id': str(i), 'title': f'item {i}'} for i in range(5)]
+
+
+class Item(BaseModel):
+    id: str
+    title: str
+
+
+class Service(BaseService):
+    INDEX = 'items'
+    MODEL = Item
+
+
+class Transport:
+    def __init__(self):
+        self.pits = []
+        self.deleted = []
+
+    async def perform_request(self, method, path, params=None, body=None):
+        if method == 'POST':
+            self.pits.append(path)
+            return {'id': 'pit-1'}
+        self.deleted.append(body['id'])
+        return {'succeeded': True}
+
+
+class Elastic:
+    """
+    Search within a point in time over the items sorted by id
+    """
+
+    def __init__(self, items: list[dict]):
+        self.items = items
+        self.transport = Transport()
+        self.searches = []
+
+    async def search(self, body):
+        self.searches.append(body)
+        after = body.get('search_after')
+        items = [
+            item for item in self.items if not after or item['id'] > after[0]
+        ][:body['size']]
+        return {
+            # the id of the point in time may change between searches
+            'pit_id': f'pit-{len(self.searches) + 1}',
+            'hits': {'hits': [
+                {
+                    '_source': {
+                        field: item[field] for field in body['_source']
+                    },
+                    'sort': [item['id']]
+                }
+                for item in items
+            ]}
+        }
+
+
+@pytest.fixture(autouse=True)
+def batch_size(monkeypatch):
+    monkeypatch.setattr(settings, 'EXPORT_BATCH_SIZE', 2)
+
+
+async def collect(batches) -> list[list[str]]:
+    return [[doc['id'] for doc in batch] async for batch in batches]
+
+
+def test_batches():
+    elastic = Elastic(ITEMS)
+    service = Service(None, elastic)
+
+    batches = asyncio.run(collect(service.es_manager.export()))
+    assert batches == [['0', '1'], ['2', '3'], ['4']]
+    assert elastic.transport.pits == ['/items/_pit']
+    # the last id of the point in time is closed
+    assert elastic.transport.deleted == ['pit-4']
+    assert all(search['sort'] == ['id:asc'] for search in elastic.searches)
+
+
+def test_batches_after_id():
+    elastic = Elastic(ITEMS)
+    service = Service(None, elastic)
+
+    batches = asyncio.run(collect(service.es_manager.export(after='2')))
+    assert batches == [['3', '4']]
+    assert elastic.searches[0]['search_after'] == ['2']
+
+
+def test_fields():
+    elastic = Elastic(ITEMS)
+    service = Service(None, elastic)
+
+    async def run():
+        return [batch async for batch in service.es_manager.export(['title'])]
+
+    batches = asyncio.run(run())
+    assert batches[0][0] == {'id': '0', 'title': 'item 0'}
+    assert elastic.searches[0]['_source'] == ['id', 'title']
+
+    with pytest.raises(ValueError):
+        service.es_manager.export(['rating'])
+
+
+def test_interrupted_export_closes_pit():
+    elastic = Elastic(ITEMS)
+    service = Service(None, elastic)
+
+    async def run():
+        batches = service.es_manager.export()
+        first = await batches.__anext__()
+        await batches.aclose()
+        return first
+
+    assert len(asyncio.run(run())) == 2
+    assert elastic.transport.deleted == ['pit-2']
+
+
+def test_ndjson_response():
+    elastic = Elastic(ITEMS)
+    service = Service(None, elastic)
+
+    async def run():
+        response = await ndjson_response(
+            service.es_manager.export(), 'Items not found'
+        )
+        return b''.join([chunk async for chunk in response.body_iterator])
+
+    lines = asyncio.run(run()).decode().splitlines()
+    assert lines[0] == '{"id":"0","title":"item 0"}'
+    assert len(lines) == 5
+    assert elastic.transport.deleted == ['pit-4']
+
+
+def test_empty_export():
+    elastic = Elastic([])
+    service = Service(None, elastic)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ndjson_response(
+            service.es_manager.export(), 'Items not found'
+        ))
+    assert error.value.status_code == 404
+    assert elastic.transport.deleted == ['pit-2']
@@ -0,0 +1,70 @@
+import time
+
+from utils.local_cache import (
+    WORKER_ID, LocalCache, handle_invalidation, local_cache
+)
+
+
+def test_get_set_delete():
+    cache = LocalCache(max_size=10, ttl=60)
+    assert cache.get('key') is None
+
+    cache.set('key', 'value')
+    assert cache.get('key') == 'value'
+
+    cache.delete('key')
+    cache.delete('key')
+    assert cache.get('key') is None
+
+
+def test_lru_eviction():
+    cache = LocalCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # a becomes the most recently used, b is evicted
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_ttl(monkeypatch):
+    cache = LocalCache(max_size=10, ttl=10)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    cache.set('key', 'value')
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 9)
+    assert cache.get('key') == 'value'
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert cache.get('key') is None
+    assert len(cache) == 0
+
+
+def test_clear():
+    cache = LocalCache(max_size=10, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_batched_invalidation():
+    local_cache.set('a', 1)
+    local_cache.set('b', 2)
+    local_cache.set('c', 3)
+    try:
+        handle_invalidation(b'other-worker:a\nb')
+        assert local_cache.get('a') is None
+        assert local_cache.get('b') is None
+        assert local_cache.get('c') == 3
+
+        # the sender skips its own message
+        handle_invalidation(f'{WORKER_ID}:c'.encode())
+        assert local_cache.get('c') == 3
+    finally:
+        local_cache.clear()
@@ -0,0 +1,115 @@
+import asyncio
+import base64
+
+import orjson
+import pytest
+from pydantic import BaseModel
+
+from services.base import TIEBREAKER, BaseService, ElasticSearchManager
+from utils.pagination import (
+    Page, PageBody, decode_cursor, encode_cursor, with_cursor
+)
+
+SORT = ['title:asc', TIEBREAKER]
+
+
+class Item(BaseModel):
+    id: str
+    title: str
+
+
+class Service(BaseService):
+    INDEX = 'items'
+    MODEL = Item
+
+
+class Elastic:
+    """
+    Search over the items sorted by title and id, honouring search_after
+    """
+
+    def __init__(self, items: list[dict]):
+        self.items = sorted(
+            items, key=lambda item: (item['title'], item['id'])
+        )
+        self.searches = []
+
+    async def search(self, index, body, from_, size, sort, **kwargs):
+        self.searches.append({'body': body, 'from_': from_, 'sort': sort})
+        items = self.items
+        if after := body.get('search_after'):
+            items = [
+                item for item in items
+                if [item['title'], item['id']] > after
+            ]
+        items = items[from_ or 0:][:size]
+        return {'hits': {'hits': [
+            {'_source': item, 'sort': [item['title'], item['id']]}
+            for item in items
+        ]}}
+
+
+def test_round_trip():
+    cursor = encode_cursor(['Star Wars', '42'], SORT)
+    assert decode_cursor(cursor, SORT) == ['Star Wars', '42']
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64 !',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    # a plain list of values, as cursors were before they kept the sort
+    base64.urlsafe_b64encode(orjson.dumps(['Star Wars', '42'])).decode(),
+    encode_cursor([], SORT),
+    encode_cursor(['Star Wars'], SORT),
+    encode_cursor(['Star Wars', '42', 'extra'], SORT),
+    encode_cursor([['Star Wars'], '42'], SORT),
+    encode_cursor([8.6, '42'], ['imdb_rating:desc', TIEBREAKER]),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, SORT)
+
+
+def test_with_cursor():
+    assert with_cursor([1], None) == [1]
+
+    page = with_cursor([1], 'next')
+    assert isinstance(page, Page) and page.next_cursor == 'next'
+
+    body = with_cursor(b'[1]', 'next')
+    assert isinstance(body, PageBody) and body.next_cursor == 'next'
+    assert body == b'[1]'
+
+
+def test_get_list_by_cursor():
+    elastic = Elastic([
+        {'id': str(i), 'title': title}
+        for i, title in enumerate(['c', 'a', 'b', 'a', 'd'])
+    ])
+    service = Service(None, elastic)
+    manager = ElasticSearchManager(service)
+
+    async def run():
+        pages, cursor = [], None
+        while True:
+            page = await manager.get_list(
+                sort='title', page_size=2, cursor=cursor
+            )
+            pages.append([item.id for item in page])
+            if not (cursor := page.next_cursor):
+                return pages
+
+    assert asyncio.run(run()) == [['1', '3'], ['2', '0'], ['4']]
+    assert [search['from_'] for search in elastic.searches] == [0, None, None]
+    assert elastic.searches[0]['sort'] == SORT
+    assert elastic.searches[1]['body']['search_after'] == ['a', '3']
+
+
+def test_get_list_with_cursor_of_other_sort():
+    elastic = Elastic([{'id': '1', 'title': 'a'}])
+    manager = ElasticSearchManager(Service(None, elastic))
+    cursor = encode_cursor(['a', '1'], SORT)
+
+    with pytest.raises(ValueError):
+        asyncio.run(manager.get_list(sort='-title', cursor=cursor))
+    assert elastic.searches == []
@@ -0,0 +1,81 @@
+import asyncio
+
+from elasticsearch import NotFoundError
+
+from api.v1.models.person import Person
+from services.films import FilmService
+from services.persons import PersonService
+
+
+def get_buckets(films: dict[str, list[str]]) -> dict:
+    return {'persons': {'ids': {'buckets': [
+        {'key': person_id, 'films': {'ids': {'buckets': [
+            {'key': film_id} for film_id in film_ids
+        ]}}}
+        for person_id, film_ids in films.items()
+    ]}}}
+
+
+class Elastic:
+    """
+    Answers the aggregation of person films by role
+    """
+
+    def __init__(self, aggregations: dict | None):
+        self.aggregations = aggregations
+        self.bodies = []
+
+    async def search(self, index, body):
+        self.bodies.append(body)
+        if self.aggregations is None:
+            raise NotFoundError(404, 'index_not_found_exception', {})
+        return {'aggregations': self.aggregations}
+
+
+AGGREGATIONS = {
+    'actors': get_buckets({'lucas': ['a'], 'ford': ['a', 'b']}),
+    'writers': get_buckets({'lucas': ['a', 'c']}),
+    'directors': get_buckets({}),
+}
+
+
+def test_get_person_films():
+    elastic = Elastic(AGGREGATIONS)
+    service = FilmService(None, elastic)
+
+    person_films = asyncio.run(
+        service.get_person_films(['lucas', 'ford'], size=10)
+    )
+    assert person_films == {
+        'lucas': {'actors': ['a'], 'writers': ['a', 'c']},
+        'ford': {'actors': ['a', 'b']},
+    }
+    body = elastic.bodies[0]
+    assert body['size'] == 0
+    persons = body['aggs']['actors']['aggs']['persons']
+    assert persons['filter'] == {'terms': {'actors.id': ['lucas', 'ford']}}
+    assert persons['aggs']['ids']['terms']['size'] == 2
+    films = persons['aggs']['ids']['aggs']['films']
+    assert films['aggs']['ids']['terms']['size'] == 10
+
+
+def test_add_person_movies():
+    service = PersonService(None, Elastic(AGGREGATIONS))
+    persons = [
+        Person(id='lucas', full_name='George Lucas'),
+        Person(id='hamill', full_name='Mark Hamill'),
+    ]
+
+    result = asyncio.run(service.add_person_movies(persons))
+    # persons without films are dropped when somebody has films
+    assert [
+        (person.id, person.role, person.film_ids) for person in result
+    ] == [('lucas', 'writer', ['a', 'c']), ('lucas', 'actor', ['a'])]
+
+
+def test_add_person_movies_without_films():
+    person = Person(id='hamill', full_name='Mark Hamill')
+
+    for aggregations in ({}, None):
+        service = PersonService(None, Elastic(aggregations))
+        assert asyncio.run(service.add_person_movies(person)) == [person]
@@ -0,0 +1,50 @@
+import asyncio
+
+from api.v1.utils.query_parser import QueryParser
+from services.films import FilmService
+from services.similarity import get_similar_key
+
+
+def test_no_params(redis):
+    service = FilmService(redis, None)
+    body = asyncio.run(QueryParser.parse_params(service, query=None, genre=''))
+    assert body == {}
+
+
+def test_scoring_and_filter_clauses(redis):
+    service = FilmService(redis, None)
+
+    async def run():
+        await redis.set(get_similar_key('film'), b'["a", "b"]')
+        return await QueryParser.parse_params(
+            service, query='star', genre='sci-fi', person='lucas',
+            similar_to='film'
+        )
+
+    body = asyncio.run(run())
+    bool_query = body['query']['bool']
+    must, filters = bool_query['must'], bool_query['filter']
+    # relevance params are scored, the others only filter
+    assert must[0] == {'multi_match': {
+        'query': 'star', 'fields': ['title^5', 'description']
+    }}
+    assert [
+        clause['ids']['values'] for clause in must[1]['bool']['should']
+    ] == [['a'], ['b']]
+    assert filters[0] == {'nested': {
+        'path': 'genres', 'query': {'match': {'genres.id': 'sci-fi'}}
+    }}
+    assert [
+        clause['nested']['path'] for clause in filters[1]['bool']['should']
+    ] == ['actors', 'writers', 'directors']
+
+
+def test_filters_only(redis):
+    service = FilmService(redis, None)
+    body = asyncio.run(QueryParser.parse_params(service, genre='sci-fi'))
+    assert list(body['query']['bool']) == ['filter']
+
+
+def test_parse_sort():
+    assert QueryParser.parse_sort('-imdb_rating') == 'imdb_rating:desc'
+    assert QueryParser.parse_sort('title') == 'title:asc'
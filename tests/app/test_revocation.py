@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+
+from utils import pubsub, revocation
+from utils.access_validation import async_is_token_valid
+from utils.revocation import (
+    RevokedTokens, encode_revocation, handle_revocation, revoked_tokens
+)
+
+SECRET_KEY = 'secret'
+ACCESS_TOKEN_EXPIRE = 300
+
+
+class Redis:
+    """
+    The blocklist in Redis must not be asked once the local copy is complete
+    """
+
+    async def get(self, key):
+        raise AssertionError(f'Redis is asked for {key}')
+
+
+def get_token(jti: str) -> str:
+    return jwt.encode({
+        'jti': jti, 'sub': {'user_id': 'user'},
+        'exp': time.time() + ACCESS_TOKEN_EXPIRE
+    }, SECRET_KEY, algorithm='HS256')
+
+
+@pytest.fixture
+def tokens():
+    revoked_tokens.reset()
+    yield revoked_tokens
+    revoked_tokens.reset()
+
+
+def test_not_synced():
+    tokens = RevokedTokens()
+    tokens.add('key', time.time() + ACCESS_TOKEN_EXPIRE)
+    assert tokens.is_revoked('key') is None
+
+
+def test_complete_marker():
+    tokens, now = RevokedTokens(), time.time()
+    tokens.load([(b'key', now + 10)], complete_at=b'%f' % (now + 5))
+    assert tokens.complete_at == pytest.approx(now + 5)
+    assert tokens.is_revoked('key') is None
+
+    tokens.load([(b'key', now + 10)], complete_at=b'%f' % (now - 5))
+    assert tokens.is_revoked('key') is True
+    assert tokens.is_revoked('other') is False
+
+
+def test_revocation_after_subscription_skips_redis(monkeypatch, tokens):
+    # subscribed before the first revocation, there is no marker yet
+    tokens.load([], complete_at=None)
+    complete_at = time.time() + ACCESS_TOKEN_EXPIRE
+    handle_revocation(encode_revocation('user:first', complete_at))
+    assert tokens.complete_at == complete_at
+    assert tokens.is_revoked('user:first') is None
+
+    # tokens blocklisted before the first revocation have expired by then
+    now = complete_at + 1
+    monkeypatch.setattr(revocation.time, 'time', lambda: now)
+    handle_revocation(
+        encode_revocation('user:revoked', now + ACCESS_TOKEN_EXPIRE)
+    )
+
+    async def run():
+        return [
+            await async_is_token_valid(get_token(jti), SECRET_KEY, Redis())
+            for jti in ('revoked', 'valid')
+        ]
+
+    (revoked, message), (valid, _) = asyncio.run(run())
+    assert not revoked and message == 'Token is in the blocklist'
+    assert valid
+
+
+class PubSub:
+    """
+    Subscription over a connection that silently stopped answering
+    """
+
+    def __init__(self):
+        self.pings = 0
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.messages = [{'type': 'subscribe', 'data': 1}]
+
+    async def get_message(self, timeout):
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.sleep(timeout)
+        return None
+
+    async def ping(self):
+        self.pings += 1
+
+    async def close(self):
+        self.closed = True
+
+
+class SilentRedis:
+    def __init__(self):
+        self.subscriptions = []
+
+    def pubsub(self):
+        self.subscriptions.append(PubSub())
+        return self.subscriptions[-1]
+
+
+def test_silent_connection_is_dropped():
+    redis, events = SilentRedis(), []
+
+    async def run():
+        listener = asyncio.create_task(pubsub.subscribe(
+            redis, 'channel', events.append,
+            on_subscribe=lambda: events.append('subscribe'),
+            on_reset=lambda: events.append('reset'),
+            reconnect_delay=0, heartbeat_interval=0.01
+        ))
+        await asyncio.sleep(0.1)
+        listener.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await listener
+
+    asyncio.run(run())
+    # every subscription pings, gets no reply and is reset
+    assert len(redis.subscriptions) > 1
+    assert events[:3] == ['subscribe', 'reset', 'subscribe']
+    assert all(item.pings and item.closed for item in redis.subscriptions)
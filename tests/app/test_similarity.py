@@ -0,0 +1,122 @@
+import asyncio
+
+from aioredis import RedisError
+
+from core.config import settings
+from services.films import FilmService
+from services.similarity import SimilarityEngine, compute_similar
+
+FILMS = {
+    'a': ({'drama', 'comedy'}, 8.0),
+    'b': ({'drama', 'comedy'}, 6.0),
+    'c': ({'drama'}, 9.0),
+    'd': ({'horror'}, 7.0),
+    'e': ({'horror', 'comedy'}, 5.0),
+}
+
+
+def test_similar_order():
+    similar = compute_similar(
+        FILMS, top_k=3, candidates_per_genre=10, rating_weight=0
+    )
+    # same genres first, then by the share of common genres
+    assert similar['a'] == ['b', 'c', 'e']
+    assert similar['d'] == ['e']
+
+
+def test_no_self_and_no_common_genre():
+    similar = compute_similar(
+        FILMS, top_k=10, candidates_per_genre=10, rating_weight=0.5
+    )
+    for film_id, similar_ids in similar.items():
+        assert film_id not in similar_ids
+        assert all(
+            FILMS[film_id][0] & FILMS[other][0] for other in similar_ids
+        )
+        assert len(similar_ids) == len(set(similar_ids))
+
+
+def test_rating_weight():
+    films = {
+        'a': ({'drama'}, 5.0),
+        'b': ({'drama'}, 6.0),
+        'c': ({'drama'}, 9.0),
+    }
+    similar = compute_similar(
+        films, top_k=1, candidates_per_genre=10, rating_weight=1
+    )
+    assert similar['a'] == ['c']
+
+
+def test_candidates_per_genre():
+    films = {
+        'a': ({'drama'}, 1.0),
+        'b': ({'drama'}, 2.0),
+        'c': ({'drama'}, 3.0),
+    }
+    similar = compute_similar(
+        films, top_k=10, candidates_per_genre=2, rating_weight=0
+    )
+    # only the best rated films of the genre are candidates
+    assert set(similar['a']) == {'b', 'c'}
+    assert similar['c'] == ['b']
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise RedisError('Connection refused')
+
+
+class Elastic:
+    """
+    Scroll over FILMS in one page
+    """
+
+    async def search(self, **kwargs):
+        return {
+            '_scroll_id': 'scroll',
+            '_shards': {'total': 1, 'successful': 1, 'skipped': 0},
+            'hits': {'hits': [
+                {'_id': film_id, '_source': {
+                    'genres': [{'id': genre} for genre in genres],
+                    'imdb_rating': rating
+                }} for film_id, (genres, rating) in FILMS.items()
+            ]}
+        }
+
+    async def scroll(self, **kwargs):
+        return {
+            '_scroll_id': 'scroll',
+            '_shards': {'total': 1, 'successful': 1, 'skipped': 0},
+            'hits': {'hits': []}
+        }
+
+    async def clear_scroll(self, **kwargs):
+        pass
+
+
+def test_rebuild(redis):
+    engine = SimilarityEngine(redis, Elastic())
+
+    async def run():
+        await engine.rebuild()
+        return await engine.get_similar('a'), await engine.get_similar('x')
+
+    similar, unknown = asyncio.run(run())
+    expected = compute_similar(
+        FILMS, top_k=settings.SIMILARITY_TOP_K,
+        candidates_per_genre=settings.SIMILARITY_CANDIDATES_PER_GENRE,
+        rating_weight=settings.SIMILARITY_RATING_WEIGHT
+    )
+    assert similar == expected['a']
+    assert unknown is None
+
+
+def test_similar_to_without_redis():
+    service = FilmService(BrokenRedis(), None)
+    query = asyncio.run(service.similar_to('a'))
+    # films sharing genres are found with a terms lookup
+    terms = query['bool']['must'][0]['nested']['query']['terms']
+    assert terms['genres.id'] == {
+        'index': service.INDEX, 'id': 'a', 'path': 'genres.id'
+    }
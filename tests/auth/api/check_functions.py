@@ -1,7 +1,11 @@
+import time
 from http import HTTPStatus
 
 from api.v1.utils.tokens import get_cache_keys
 from databases import cache
+from utils.revocation import (
+    BLOCKLIST_COMPLETE_KEY, BLOCKLIST_KEY, decode_revocation
+)
 
 
 def check_tokens_in_blocklist(refresh_jwt):
@@ -9,6 +13,21 @@ def check_tokens_in_blocklist(refresh_jwt):
     assert cache.get(refresh_key) and cache.get(access_key)
 
 
+def check_revocation_pushed(refresh_jwt, pubsub):
+    """
+    Access token is in the blocklist zset and was published to
+    the subscribed pubsub
+    """
+    _, access_key = get_cache_keys(refresh_jwt)
+    assert cache.zscore(BLOCKLIST_KEY, access_key) > time.time()
+    assert cache.get(BLOCKLIST_COMPLETE_KEY)
+
+    message = pubsub.get_message(timeout=1)
+    while message and message['type'] != 'message':
+        message = pubsub.get_message(timeout=1)
+    assert message and decode_revocation(message['data'])[0] == access_key
+
+
 def check_unauthorized(client, url, method, **kwargs):
     resp = getattr(client, method)(url, **kwargs)
     assert resp.status_code == HTTPStatus.UNAUTHORIZED
@@ -2,16 +2,18 @@ import json
 
 from auth.api.check_functions import (
     check_unauthorized, check_unprocessable_entity, check_ok, check_bad_request,
-    check_method_not_allowed, check_tokens_in_blocklist
+    check_method_not_allowed, check_tokens_in_blocklist,
+    check_revocation_pushed
 )
 from auth.conftest import (
     BASE_EMAIL, BASE_PASSWORD, BASE_ID, HEADERS_WITH_BAD_TOKEN, db_add
 )
-from flask_jwt_extended import get_jwt
+from flask_jwt_extended import decode_token, get_jwt
 
 from api.models import User, LoginHistory
 from api.v1.user_api import URL_USER_PROFILE, URL_USER_PREFIX
-from databases import db
+from databases import db, cache
+from utils.revocation import REVOCATION_CHANNEL
 
 USERNAME = 'Corvax'
 NEW_EMAIL = 'princess@sylvia.bbc'
@@ -248,6 +250,19 @@ def test_logout(client, get_refresh_token):
     check_tokens_in_blocklist(get_jwt())
 
 
+def test_logout_pushes_revocation(client, get_refresh_token):
+    url = URL_USER_PREFIX + '/logout'
+    pubsub = cache.pubsub()
+    pubsub.subscribe(REVOCATION_CHANNEL)
+
+    refresh_token = get_refresh_token()
+    client.set_cookie('localhost', 'refresh_token_cookie', refresh_token)
+    check_ok(client, url, 'delete')
+
+    check_revocation_pushed(decode_token(refresh_token), pubsub)
+    pubsub.close()
+
+
 def test_refresh(client, get_refresh_token):
     url = URL_USER_PREFIX + '/refresh'
     method = 'post'
@@ -0,0 +1,23 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+ROOT = Path(__file__).resolve().parents[2]
+
+os.environ.setdefault('JWT_SECRET_KEY', 'test')
+# the service is run from its own directory, the shared utils are copied
+# next to it in its image
+sys.path.insert(0, str(ROOT / 'auth_grpc'))
+sys.path.append(str(ROOT))
+
+# app and core of the service are cached before pytest puts the root of
+# the repo, with the app and core of the API, in front of them
+import auth_server  # noqa: E402,F401
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
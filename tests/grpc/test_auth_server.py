@@ -0,0 +1,276 @@
+import asyncio
+import time
+import uuid
+
+import fakeredis
+import jwt
+import pytest
+
+import auth_server
+from auth_server import AuthService, AsyncAuthService
+from core.settings import settings
+from utils.grpc import auth_pb2 as pb2
+
+USER_ID = str(uuid.uuid4())
+OTHER_USER_ID = str(uuid.uuid4())
+
+
+def get_token(user_id=USER_ID, jti=None):
+    return jwt.encode(
+        {
+            'sub': {'user_id': user_id, 'roles': []},
+            'jti': jti or str(uuid.uuid4()),
+            'exp': int(time.time()) + 300
+        },
+        settings.JWT_SECRET_KEY, algorithm='HS256'
+    )
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class Session:
+    def __init__(self, factory):
+        self.factory = factory
+
+    def execute(self, query):
+        self.factory.queries += 1
+        if self.factory.error:
+            raise self.factory.error
+        return Result([
+            (uuid.UUID(user_id), role)
+            for user_id, roles in self.factory.roles.items()
+            for role in roles
+        ])
+
+
+class AsyncSession(Session):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def execute(self, query):
+        return super().execute(query)
+
+
+class SessionFactory:
+    def __init__(self, roles, async_=False, error=None):
+        self.roles = roles
+        self.async_ = async_
+        self.error = error
+        self.queries = 0
+
+    def __call__(self):
+        return AsyncSession(self) if self.async_ else Session(self)
+
+
+class Database:
+    def __init__(self, factory):
+        self.session = factory()
+
+
+@pytest.fixture
+def roles(monkeypatch):
+    factory = SessionFactory({USER_ID: ['admin'], OTHER_USER_ID: []})
+    monkeypatch.setattr(auth_server, 'cache', fakeredis.FakeRedis())
+    monkeypatch.setattr(auth_server, 'db', Database(factory))
+    return factory
+
+
+def test_batch_has_access_queries_roles_once(roles):
+    batch = pb2.BatchMessage(messages=[
+        pb2.Message(token=get_token(), roles=['admin'], id='1'),
+        pb2.Message(token=get_token(OTHER_USER_ID), roles=['admin'], id='2'),
+        pb2.Message(token='', roles=['admin'], id='3'),
+        pb2.Message(token=get_token(), roles=[], id='4'),
+    ])
+
+    response = AuthService().BatchHasAccess(batch, None)
+
+    assert [r.id for r in response.responses] == ['1', '2', '3', '4']
+    assert [r.has_access for r in response.responses] == [
+        True, False, False, True
+    ]
+    assert roles.queries == 1
+
+
+def test_required_roles_are_all_checked(roles):
+    token = get_token()
+
+    def check(*required):
+        message = pb2.Message(token=token, roles=required)
+        return AuthService().HasAccess(message, None)
+
+    assert check('admin').has_access
+    assert not check('admin', 'editor').has_access
+    assert check('admin', 'editor').message == (
+        'Not enough permissions to access'
+    )
+
+
+def test_stream_answers_every_message_with_its_id(roles):
+    token = get_token()
+    messages = [
+        pb2.Message(token=token, roles=['admin'], id=str(i))
+        for i in range(3)
+    ] + [pb2.Message(token='', id='3')]
+
+    responses = list(AuthService().HasAccessStream(iter(messages), None))
+
+    assert [r.id for r in responses] == ['0', '1', '2', '3']
+    assert [r.has_access for r in responses] == [True, True, True, False]
+
+
+class Context:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.responses = []
+
+    async def write(self, response):
+        await asyncio.sleep(self.delay)
+        self.responses.append(response)
+
+
+async def stream(*messages):
+    for message in messages:
+        yield message
+
+
+@pytest.fixture
+def service(redis):
+    return AsyncAuthService(
+        redis, SessionFactory(
+            {USER_ID: ['admin'], OTHER_USER_ID: []}, async_=True
+        )
+    )
+
+
+def test_async_has_access(service):
+    token = get_token()
+
+    async def check(*roles):
+        message = pb2.Message(token=token, roles=roles, id='1')
+        return await service.HasAccess(message, None)
+
+    allowed = asyncio.run(check('admin'))
+    denied = asyncio.run(check('editor'))
+    no_roles = asyncio.run(check())
+
+    assert allowed.has_access and allowed.id == '1'
+    assert not denied.has_access
+    assert denied.message == 'Not enough permissions to access'
+    assert no_roles.has_access
+    # a token without roles to check doesn't need the database
+    assert service.session_factory.queries == 2
+
+
+def test_rejects_bad_and_revoked_tokens(service, redis):
+    revoked = get_token(jti='revoked')
+    asyncio.run(redis.set(f'{USER_ID}:revoked', 'true'))
+
+    async def check(token):
+        message = pb2.Message(token=token, roles=['admin'])
+        return await service.HasAccess(message, None)
+
+    assert asyncio.run(check('')).message == 'No access token'
+    assert not asyncio.run(check('bad.token.value')).has_access
+    response = asyncio.run(check(revoked))
+    assert not response.has_access
+    assert response.message == 'Token is in the blocklist'
+    assert service.session_factory.queries == 0
+
+
+def test_async_batch_has_access_queries_roles_once(service):
+    batch = pb2.BatchMessage(messages=[
+        pb2.Message(token=get_token(), roles=['admin'], id='1'),
+        pb2.Message(token=get_token(OTHER_USER_ID), roles=['admin'], id='2'),
+        pb2.Message(token='', roles=['admin'], id='3'),
+        pb2.Message(token=get_token(), roles=[], id='4'),
+    ])
+
+    response = asyncio.run(service.BatchHasAccess(batch, None))
+
+    assert [r.id for r in response.responses] == ['1', '2', '3', '4']
+    assert [r.has_access for r in response.responses] == [
+        True, False, False, True
+    ]
+    assert service.session_factory.queries == 1
+
+
+def test_async_stream_answers_every_message(service, monkeypatch):
+    monkeypatch.setattr(settings, 'GRPC_STREAM_MAX_CONCURRENCY', 2)
+    token = get_token()
+    messages = [
+        pb2.Message(token=token, roles=['admin'], id=str(i))
+        for i in range(5)
+    ]
+    context = Context(delay=0.01)
+
+    asyncio.run(service.HasAccessStream(stream(*messages), context))
+
+    assert sorted(r.id for r in context.responses) == [
+        str(i) for i in range(5)
+    ]
+    assert all(r.has_access for r in context.responses)
+
+
+def test_stream_bounds_concurrent_checks(service, monkeypatch):
+    monkeypatch.setattr(settings, 'GRPC_STREAM_MAX_CONCURRENCY', 2)
+    running, peak = 0, 0
+
+    async def check_access(requests):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return [auth_server.get_response('success', True, requests[0].id)]
+
+    monkeypatch.setattr(service, 'check_access', check_access)
+    messages = [pb2.Message(token='t', id=str(i)) for i in range(6)]
+    context = Context()
+
+    asyncio.run(service.HasAccessStream(stream(*messages), context))
+
+    assert len(context.responses) == 6
+    assert peak == 2
+
+
+def test_stream_answers_failed_checks(redis):
+    service = AsyncAuthService(
+        redis, SessionFactory(
+            {}, async_=True, error=ConnectionError('database is down')
+        )
+    )
+    messages = [
+        pb2.Message(token=get_token(), roles=['admin'], id='1'),
+        pb2.Message(token=get_token(), roles=[], id='2'),
+    ]
+    context = Context()
+
+    asyncio.run(service.HasAccessStream(stream(*messages), context))
+
+    responses = {r.id: r for r in context.responses}
+    assert not responses['1'].has_access
+    assert responses['1'].message == 'Access check failed'
+    assert responses['2'].has_access
+
+
+def test_stream_is_aborted_when_responses_cant_be_sent(service):
+    class BrokenContext:
+        async def write(self, response):
+            raise ConnectionResetError('stream is closed')
+
+    messages = [pb2.Message(token=get_token(), id=str(i)) for i in range(3)]
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(
+            service.HasAccessStream(stream(*messages), BrokenContext())
+        )
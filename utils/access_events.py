@@ -0,0 +1,27 @@
+ROLES_CHANGED_CHANNEL = 'users:roles_changed'
+ALL_USERS = '*'
+ACCESS_KEY_PREFIX = 'access:'
+
+
+def get_access_key(user_id: str) -> str:
+    """
+    Hash of cached access decisions of the user
+    """
+    return f'{ACCESS_KEY_PREFIX}{user_id}'
+
+
+def publish_roles_changed(redis, user_id: str = ALL_USERS) -> None:
+    """
+    Drop cached access decisions of the user, of all users by default,
+    in Redis and in every service
+    """
+    if user_id == ALL_USERS:
+        keys = list(redis.scan_iter(match=f'{ACCESS_KEY_PREFIX}*'))
+    else:
+        keys = [get_access_key(user_id)]
+
+    pipe = redis.pipeline()
+    if keys:
+        pipe.delete(*keys)
+    pipe.publish(ROLES_CHANGED_CHANNEL, str(user_id))
+    pipe.execute()
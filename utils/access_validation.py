@@ -1,6 +1,63 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
 
+from utils.revocation import revoked_tokens
+
 SUPERUSER = 'superuser'
+TOKEN_CACHE_MAX_SIZE = 10000
+
+
+class TokenCache:
+    """
+    LRU of payloads of verified tokens, so repeated requests of a session
+    skip the signature check. Entries live until the token expires, tokens
+    are kept only as hashes. The blocklist is still checked on every
+    request, so revoked tokens are rejected regardless of the cache
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        # the gRPC server verifies tokens in a thread pool
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self.get_key(token)
+        with self._lock:
+            payload = self._data.get(key)
+            if payload is None:
+                return None
+            if payload['exp'] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        # tokens without expiration aren't cached
+        if 'exp' not in payload:
+            return
+        key = self.get_key(token)
+        with self._lock:
+            self._data[key] = payload
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+token_cache = TokenCache()
 
 
 def get_blocklist_key(jti: str, user_id: str) -> str:
@@ -12,6 +69,9 @@ def is_access_token_in_blocklist(jwt_payload, cache):
     user_id = jwt_payload['sub']['user_id']
 
     cache_key = get_blocklist_key(access_jti, user_id)
+    revoked = revoked_tokens.is_revoked(cache_key)
+    if revoked is not None:
+        return revoked
     return cache.get(cache_key)
 
 
@@ -20,6 +80,10 @@ async def async_is_access_token_in_blocklist(jwt_payload, cache):
     user_id = jwt_payload['sub']['user_id']
 
     cache_key = get_blocklist_key(access_jti, user_id)
+    # Redis is only asked until the local blocklist is synced and complete
+    revoked = revoked_tokens.is_revoked(cache_key)
+    if revoked is not None:
+        return revoked
     return await cache.get(cache_key)
 
 
@@ -50,10 +114,20 @@ async def async_is_authorized(secret_key, cache, **kwargs):
     return False, response
 
 
+def decode_token(token, secret_key):
+    """
+    Get the payload of the token, raises jwt errors for invalid ones
+    """
+    if payload := token_cache.get(token):
+        return payload
+    payload = jwt.decode(token, secret_key, algorithms=["HS256"])
+    token_cache.set(token, payload)
+    return payload
+
+
 def is_token_valid(token, secret_key, cache):
     try:
-        print(f'TOKEN: {token}, class: {type(token)}')
-        payload = jwt.decode(token, secret_key, algorithms=["HS256"])
+        payload = decode_token(token, secret_key)
     except Exception as e:
         return False, str(e)
 
@@ -65,8 +139,7 @@ def is_token_valid(token, secret_key, cache):
 
 async def async_is_token_valid(token, secret_key, cache):
     try:
-        print(f'TOKEN: {token}, class: {type(token)}')
-        payload = jwt.decode(token, secret_key, algorithms=["HS256"])
+        payload = decode_token(token, secret_key)
     except Exception as e:
         return False, str(e)
 
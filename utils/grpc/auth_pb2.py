@@ -14,12 +14,14 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nauth.proto\x12\x0bgrpc_server\"\'\n\x07Message\x12\r\n\x05token\x18\x01 \x01(\t\x12\r\n\x05roles\x18\x02 \x03(\t\"8\n\x11HasAccessResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x12\n\nhas_access\x18\x02 \x01(\x08\x32K\n\x04\x41uth\x12\x43\n\tHasAccess\x12\x14.grpc_server.Message\x1a\x1e.grpc_server.HasAccessResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nauth.proto\x12\x0bgrpc_server\"3\n\x07Message\x12\r\n\x05token\x18\x01 \x01(\t\x12\r\n\x05roles\x18\x02 \x03(\t\x12\n\n\x02id\x18\x03 \x01(\t\"D\n\x11HasAccessResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x12\n\nhas_access\x18\x02 \x01(\x08\x12\n\n\x02id\x18\x03 \x01(\t\"6\n\x0c\x42\x61tchMessage\x12&\n\x08messages\x18\x01 \x03(\x0b\x32\x14.grpc_server.Message\"K\n\x16\x42\x61tchHasAccessResponse\x12\x31\n\tresponses\x18\x01 \x03(\x0b\x32\x1e.grpc_server.HasAccessResponse2\xee\x01\n\x04\x41uth\x12\x43\n\tHasAccess\x12\x14.grpc_server.Message\x1a\x1e.grpc_server.HasAccessResponse\"\x00\x12R\n\x0e\x42\x61tchHasAccess\x12\x19.grpc_server.BatchMessage\x1a#.grpc_server.BatchHasAccessResponse\"\x00\x12M\n\x0fHasAccessStream\x12\x14.grpc_server.Message\x1a\x1e.grpc_server.HasAccessResponse\"\x00(\x01\x30\x01\x62\x06proto3')
 
 
 
 _MESSAGE = DESCRIPTOR.message_types_by_name['Message']
 _HASACCESSRESPONSE = DESCRIPTOR.message_types_by_name['HasAccessResponse']
+_BATCHMESSAGE = DESCRIPTOR.message_types_by_name['BatchMessage']
+_BATCHHASACCESSRESPONSE = DESCRIPTOR.message_types_by_name['BatchHasAccessResponse']
 Message = _reflection.GeneratedProtocolMessageType('Message', (_message.Message,), {
   'DESCRIPTOR' : _MESSAGE,
   '__module__' : 'auth_pb2'
@@ -34,14 +36,32 @@ HasAccessResponse = _reflection.GeneratedProtocolMessageType('HasAccessResponse'
   })
 _sym_db.RegisterMessage(HasAccessResponse)
 
+BatchMessage = _reflection.GeneratedProtocolMessageType('BatchMessage', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHMESSAGE,
+  '__module__' : 'auth_pb2'
+  # @@protoc_insertion_point(class_scope:grpc_server.BatchMessage)
+  })
+_sym_db.RegisterMessage(BatchMessage)
+
+BatchHasAccessResponse = _reflection.GeneratedProtocolMessageType('BatchHasAccessResponse', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHHASACCESSRESPONSE,
+  '__module__' : 'auth_pb2'
+  # @@protoc_insertion_point(class_scope:grpc_server.BatchHasAccessResponse)
+  })
+_sym_db.RegisterMessage(BatchHasAccessResponse)
+
 _AUTH = DESCRIPTOR.services_by_name['Auth']
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
   _MESSAGE._serialized_start=27
-  _MESSAGE._serialized_end=66
-  _HASACCESSRESPONSE._serialized_start=68
-  _HASACCESSRESPONSE._serialized_end=124
-  _AUTH._serialized_start=126
-  _AUTH._serialized_end=201
+  _MESSAGE._serialized_end=78
+  _HASACCESSRESPONSE._serialized_start=80
+  _HASACCESSRESPONSE._serialized_end=148
+  _BATCHMESSAGE._serialized_start=150
+  _BATCHMESSAGE._serialized_end=204
+  _BATCHHASACCESSRESPONSE._serialized_start=206
+  _BATCHHASACCESSRESPONSE._serialized_end=281
+  _AUTH._serialized_start=284
+  _AUTH._serialized_end=522
 # @@protoc_insertion_point(module_scope)
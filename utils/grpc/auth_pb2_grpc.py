@@ -19,6 +19,16 @@ class AuthStub(object):
                 request_serializer=auth__pb2.Message.SerializeToString,
                 response_deserializer=auth__pb2.HasAccessResponse.FromString,
                 )
+        self.BatchHasAccess = channel.unary_unary(
+                '/grpc_server.Auth/BatchHasAccess',
+                request_serializer=auth__pb2.BatchMessage.SerializeToString,
+                response_deserializer=auth__pb2.BatchHasAccessResponse.FromString,
+                )
+        self.HasAccessStream = channel.stream_stream(
+                '/grpc_server.Auth/HasAccessStream',
+                request_serializer=auth__pb2.Message.SerializeToString,
+                response_deserializer=auth__pb2.HasAccessResponse.FromString,
+                )
 
 
 class AuthServicer(object):
@@ -33,6 +43,21 @@ class AuthServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchHasAccess(self, request, context):
+        """Checks many tokens in one call, responses follow the order of messages.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def HasAccessStream(self, request_iterator, context):
+        """Checks sent over a long-lived stream, responses carry the id of
+        the message and may come in any order.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AuthServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -41,6 +66,16 @@ def add_AuthServicer_to_server(servicer, server):
                     request_deserializer=auth__pb2.Message.FromString,
                     response_serializer=auth__pb2.HasAccessResponse.SerializeToString,
             ),
+            'BatchHasAccess': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchHasAccess,
+                    request_deserializer=auth__pb2.BatchMessage.FromString,
+                    response_serializer=auth__pb2.BatchHasAccessResponse.SerializeToString,
+            ),
+            'HasAccessStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.HasAccessStream,
+                    request_deserializer=auth__pb2.Message.FromString,
+                    response_serializer=auth__pb2.HasAccessResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'grpc_server.Auth', rpc_method_handlers)
@@ -67,3 +102,37 @@ class Auth(object):
             auth__pb2.HasAccessResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def BatchHasAccess(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/grpc_server.Auth/BatchHasAccess',
+            auth__pb2.BatchMessage.SerializeToString,
+            auth__pb2.BatchHasAccessResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def HasAccessStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/grpc_server.Auth/HasAccessStream',
+            auth__pb2.Message.SerializeToString,
+            auth__pb2.HasAccessResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
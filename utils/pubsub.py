@@ -0,0 +1,105 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# a blocked read never notices a dropped connection, so subscribers ping
+# the server this often and resubscribe when nothing comes back
+HEARTBEAT_INTERVAL = 30
+
+
+class HeartbeatError(ConnectionError):
+    pass
+
+
+def check_heartbeat(channel: str, last_seen: float,
+                    heartbeat_interval: float) -> None:
+    """
+    Raises HeartbeatError if nothing, not even a reply to a ping, came
+    from the server for two intervals
+    """
+    silence = time.monotonic() - last_seen
+    if silence >= 2 * heartbeat_interval:
+        raise HeartbeatError(f'No reply on {channel} for {silence:.0f}s')
+
+
+async def subscribe(redis, channel: str, on_message: Callable[[Any], Any],
+                    on_subscribe: Callable | None = None,
+                    on_reset: Callable | None = None,
+                    reconnect_delay: float = 1,
+                    heartbeat_interval: float = HEARTBEAT_INTERVAL):
+    """
+    Pass data of every message of the channel to on_message, resubscribing
+    after failures. Messages published while unsubscribed are lost, so
+    on_subscribe is called (and awaited if needed) on every subscription
+    to catch up, on_reset when the subscription is lost
+    """
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            last_seen = last_ping = time.monotonic()
+            while True:
+                message = await pubsub.get_message(timeout=heartbeat_interval)
+                if message is None:
+                    check_heartbeat(channel, last_seen, heartbeat_interval)
+                else:
+                    last_seen = time.monotonic()
+                    if message['type'] == 'subscribe' and on_subscribe:
+                        if inspect.isawaitable(result := on_subscribe()):
+                            await result
+                    elif message['type'] == 'message':
+                        on_message(message['data'])
+
+                if time.monotonic() - last_ping >= heartbeat_interval:
+                    await pubsub.ping()
+                    last_ping = time.monotonic()
+        except asyncio.CancelledError:
+            if on_reset:
+                on_reset()
+            await pubsub.close()
+            raise
+        except Exception as e:
+            logger.warning(f'Subscription to {channel} failed: {e}')
+            if on_reset:
+                on_reset()
+            await pubsub.close()
+            await asyncio.sleep(reconnect_delay)
+
+
+def subscribe_sync(redis, channel: str, on_message: Callable[[Any], Any],
+                   on_subscribe: Callable | None = None,
+                   on_reset: Callable | None = None,
+                   reconnect_delay: float = 1,
+                   heartbeat_interval: float = HEARTBEAT_INTERVAL):
+    """
+    Same as subscribe for a blocking Redis client
+    """
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            pubsub.subscribe(channel)
+            last_seen = last_ping = time.monotonic()
+            while True:
+                message = pubsub.get_message(timeout=heartbeat_interval)
+                if message is None:
+                    check_heartbeat(channel, last_seen, heartbeat_interval)
+                else:
+                    last_seen = time.monotonic()
+                    if message['type'] == 'subscribe' and on_subscribe:
+                        on_subscribe()
+                    elif message['type'] == 'message':
+                        on_message(message['data'])
+
+                if time.monotonic() - last_ping >= heartbeat_interval:
+                    pubsub.ping()
+                    last_ping = time.monotonic()
+        except Exception as e:
+            logger.warning(f'Subscription to {channel} failed: {e}')
+            if on_reset:
+                on_reset()
+            pubsub.close()
+            time.sleep(reconnect_delay)
@@ -0,0 +1,142 @@
+import threading
+import time
+
+from utils.pubsub import HEARTBEAT_INTERVAL, subscribe, subscribe_sync
+
+REVOCATION_CHANNEL = 'tokens:revoked'
+# blocklist keys of revoked access tokens scored by their expiration time,
+# lets the subscribers load revocations they missed
+BLOCKLIST_KEY = 'tokens:blocklist'
+# time since which the zset holds all revoked access tokens: tokens revoked
+# before its first write (with plain blocklist keys) have expired by then
+BLOCKLIST_COMPLETE_KEY = 'tokens:blocklist:complete_at'
+PRUNE_INTERVAL = 60
+
+
+def encode_revocation(key: str, expires_at: float) -> str:
+    return f'{expires_at}:{key}'
+
+
+def decode_revocation(message: bytes | str) -> tuple[str, float]:
+    if isinstance(message, bytes):
+        message = message.decode()
+    expires_at, _, key = message.partition(':')
+    return key, float(expires_at)
+
+
+class RevokedTokens:
+    """
+    Local copy of the blocklist of access tokens, kept up to date by
+    a subscription to revocations. Until the copy is synced with Redis,
+    and complete, nothing can be told about a token
+    """
+
+    def __init__(self):
+        self.synced = False
+        self.complete_at = float('inf')
+        self._keys: dict[str, float] = {}
+        self._next_prune = 0
+        # read by the gRPC server threads while the listener writes
+        self._lock = threading.Lock()
+
+    def is_revoked(self, key: str) -> bool | None:
+        if not self.synced or time.time() < self.complete_at:
+            return None
+        with self._lock:
+            return self._keys.get(key, 0) > time.time()
+
+    def add(self, key: str, expires_at: float) -> None:
+        with self._lock:
+            self._keys[key] = expires_at
+            # the first revocation sets the marker to its expiration time,
+            # later ones only expire later
+            if self.complete_at == float('inf'):
+                self.complete_at = expires_at
+            self._prune()
+
+    def load(self, items, complete_at) -> None:
+        """
+        Replace the copy with (key, expires at) pairs of the blocklist
+        """
+        with self._lock:
+            self._keys = {
+                key.decode() if isinstance(key, bytes) else key: expires_at
+                for key, expires_at in items
+            }
+            self.complete_at = (
+                float('inf') if complete_at is None else float(complete_at)
+            )
+            self.synced = True
+
+    def reset(self) -> None:
+        with self._lock:
+            self.synced = False
+            self.complete_at = float('inf')
+            self._keys = {}
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._keys = {
+            key: expires_at for key, expires_at in self._keys.items()
+            if expires_at > now
+        }
+        self._next_prune = now + PRUNE_INTERVAL
+
+
+revoked_tokens = RevokedTokens()
+
+
+def handle_revocation(message: bytes | str) -> None:
+    revoked_tokens.add(*decode_revocation(message))
+
+
+async def listen_for_revocations(
+        redis, reconnect_delay: float = 1,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL
+):
+    """
+    Keep the local blocklist in sync with an asyncio Redis client.
+    The blocklist is loaded on every subscription to cover revocations
+    made before it, while disconnected it is checked in Redis
+    """
+    async def load():
+        complete_at = await redis.get(BLOCKLIST_COMPLETE_KEY)
+        revoked_tokens.load(await redis.zrangebyscore(
+            BLOCKLIST_KEY, time.time(), '+inf', withscores=True
+        ), complete_at)
+
+    await subscribe(
+        redis, REVOCATION_CHANNEL, handle_revocation,
+        on_subscribe=load, on_reset=revoked_tokens.reset,
+        reconnect_delay=reconnect_delay, heartbeat_interval=heartbeat_interval
+    )
+
+
+def listen_for_revocations_sync(
+        redis, reconnect_delay: float = 1,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL
+):
+    """
+    Same as listen_for_revocations for a blocking Redis client
+    """
+    def load():
+        complete_at = redis.get(BLOCKLIST_COMPLETE_KEY)
+        revoked_tokens.load(redis.zrangebyscore(
+            BLOCKLIST_KEY, time.time(), '+inf', withscores=True
+        ), complete_at)
+
+    subscribe_sync(
+        redis, REVOCATION_CHANNEL, handle_revocation,
+        on_subscribe=load, on_reset=revoked_tokens.reset,
+        reconnect_delay=reconnect_delay, heartbeat_interval=heartbeat_interval
+    )
+
+
+def start_revocation_listener(redis) -> threading.Thread:
+    thread = threading.Thread(
+        target=listen_for_revocations_sync, args=(redis,), daemon=True
+    )
+    thread.start()
+    return thread